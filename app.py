@@ -1,39 +1,44 @@
 # core_imports.py
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, session, jsonify
+import uuid
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, session, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import load_only
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from decimal import Decimal
 import io
 import jwt
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 from io import BytesIO
-import sqlite3
-from models import db, init_db, User, Product, Invoice, InvoiceItem, InvoicePDF
+from models import db, init_db, User, Product, Invoice, InvoiceItem, InvoicePDF, INVOICE_WITH_ITEMS, INVOICE_WITH_ITEM_PRODUCTS
 from flask_migrate import Migrate
+from render_queue import RenderQueue
+from cart_store import init_cart_store
+from db_profile import init_db_profile
+from instrumentation import init_instrumentation
+from render_profiler import init_render_profiler
+from notifications import init_notifications
+from stock import reserve_stock, StockReservationError
+from invoice_numbers import InvoiceNumberAllocator
+from pdf_storage import init_pdf_storage
+from product_search import init_product_search
+from pagination import paginate_invoices
+from export_invoices import EXPORT_FORMATS, export_invoices, parse_date
+from import_products import import_products, detect_format
+from sales_aggregates import record_invoice, dashboard_stats
+from gst_report import gst_summary, report_csv
+from money import ZERO, line_amounts, to_money
 
 # email_imports.py
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
 from flask_mail import Mail, Message
 
-# pdf_imports.py
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-
 # utility_imports.py
 import stripe
-import requests
 from functools import wraps
 from io import BytesIO
-import sqlite3
 
 # Load environment variables
 load_dotenv()
@@ -49,14 +54,55 @@ os.makedirs(INSTANCE_PATH, exist_ok=True)
 # Initialize Flask app
 app = Flask(__name__)
 
+
+class JSONEncoder(app.json_encoder):
+    """Serializes Decimal money amounts as JSON numbers"""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+app.json_encoder = JSONEncoder
+
 # Configuration
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///billing.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['PDF_RENDER_WORKERS'] = int(os.getenv('PDF_RENDER_WORKERS', 2))
+app.config['INVOICES_PER_PAGE'] = int(os.getenv('INVOICES_PER_PAGE', 50))
+app.config['PRODUCTS_PER_PAGE'] = int(os.getenv('PRODUCTS_PER_PAGE', 50))
+app.config['CART_BACKEND'] = os.getenv('CART_BACKEND', 'database')
+app.config['DB_PROFILE'] = os.getenv('DB_PROFILE', 'default')
+# Optional overrides of the profile's pool size and SQLite busy timeout (ms)
+app.config['DB_POOL_SIZE'] = os.getenv('DB_POOL_SIZE')
+app.config['DB_MAX_OVERFLOW'] = os.getenv('DB_MAX_OVERFLOW')
+app.config['SQLITE_BUSY_TIMEOUT'] = os.getenv('SQLITE_BUSY_TIMEOUT')
+app.config['PDF_STORAGE_BACKEND'] = os.getenv('PDF_STORAGE_BACKEND', 'filesystem')
+app.config['PDF_STORAGE_DIR'] = os.getenv('PDF_STORAGE_DIR', os.path.join(INSTANCE_PATH, 'pdfs'))
+# Let the front-end proxy (e.g. nginx) serve stored PDFs from disk
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '0') == '1'
+# Server-Timing headers and a /metrics endpoint; METRICS_TOKEN requires a bearer token
+app.config['INSTRUMENTATION'] = os.getenv('INSTRUMENTATION', '0') == '1'
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+# Profile a fraction of PDF renders into PDF_PROFILE_DIR ('cprofile' or 'sampling' mode)
+app.config['PDF_PROFILING'] = os.getenv('PDF_PROFILING', '0') == '1'
+app.config['PDF_PROFILE_SAMPLE_RATE'] = float(os.getenv('PDF_PROFILE_SAMPLE_RATE', 0.01))
+app.config['PDF_PROFILE_MODE'] = os.getenv('PDF_PROFILE_MODE', 'cprofile')
+app.config['PDF_PROFILE_INTERVAL'] = float(os.getenv('PDF_PROFILE_INTERVAL', 2))
+app.config['PDF_PROFILE_DIR'] = os.getenv('PDF_PROFILE_DIR', os.path.join(INSTANCE_PATH, 'profiles'))
 
 # Initialize extensions
 init_db(app)
+db_profile = init_db_profile(app)
 migrate = Migrate(app, db)
+render_queue = RenderQueue(app)
+cart_store = init_cart_store(app)
+invoice_number_allocator = InvoiceNumberAllocator(block_size=os.getenv('INVOICE_NUMBER_BLOCK_SIZE', 1))
+pdf_storage = init_pdf_storage(app)
+product_search = init_product_search(app)
+instrumentation = init_instrumentation(app)
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
 
@@ -88,6 +134,19 @@ SMTP_PORT = 587
 EMAIL_USERNAME = 'your-email@gmail.com'
 EMAIL_PASSWORD = 'your-app-password'
 
+# Outbox delivery of the email and SMS notifications
+app.config['SMTP_SERVER'] = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
+app.config['SMTP_PORT'] = int(os.getenv('SMTP_PORT', 465))
+app.config['SMTP_USE_SSL'] = os.getenv('SMTP_USE_SSL', '1') == '1'
+app.config['EMAIL_USERNAME'] = os.getenv('EMAIL_USERNAME', EMAIL_USERNAME)
+app.config['EMAIL_PASSWORD'] = os.getenv('EMAIL_PASSWORD', EMAIL_PASSWORD)
+app.config['FAST2SMS_API_KEY'] = os.getenv('FAST2SMS_API_KEY', FAST2SMS_API_KEY)
+app.config['FAST2SMS_URL'] = os.getenv('FAST2SMS_URL', FAST2SMS_URL)
+app.config['SMS_BATCH_SIZE'] = int(os.getenv('SMS_BATCH_SIZE', 100))
+app.config['NOTIFY_MAX_ATTEMPTS'] = int(os.getenv('NOTIFY_MAX_ATTEMPTS', 6))
+# Run the delivery thread in this process; 0 leaves it to `python notifications.py`
+app.config['NOTIFY_WORKER'] = os.getenv('NOTIFY_WORKER', '1') == '1'
+
 # User loader
 @login_manager.user_loader
 def load_user(user_id):
@@ -96,19 +155,21 @@ def load_user(user_id):
 # Routes
 @app.route('/')
 def index():
-    search_query = request.args.get('search', '')
+    search_query = request.args.get('search', '').strip()
     show_hidden = request.args.get('show_hidden', '0') == '1'
-    
-    query = Product.query
-    
-    if search_query:
-        query = query.filter(Product.name.ilike(f'%{search_query}%'))
+    page = max(request.args.get('page', 1, type=int), 1)
 
-    if not show_hidden:
-        query = query.filter_by(hidden=False)
-    
-    products = query.all()
-    return render_template('index.html', products=products, show_hidden=show_hidden)
+    # Ranked, paginated search on the product search index
+    products, has_next = product_search.search(search_query, show_hidden=show_hidden, page=page)
+
+    # Dashboard figures come from the precomputed sales aggregates
+    stats, recent_invoices = None, []
+    if current_user.is_authenticated:
+        stats = dashboard_stats(current_user.id)
+        recent_invoices, _ = paginate_invoices(Invoice.query, current_user.id, limit=5)
+    return render_template('index.html', products=products, show_hidden=show_hidden,
+                           search_query=search_query, page=page, has_next=has_next,
+                           stats=stats, invoices=recent_invoices)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -144,66 +205,43 @@ def logout():
     return redirect(url_for('index'))
 
 def send_sms(phone_number, message):
+    """Queue an SMS in the notification outbox; delivered in the background once the caller commits"""
     try:
-        payload = {
-            'authorization': FAST2SMS_API_KEY,
-            'message': message,
-            'language': 'english',
-            'route': 'q',
-            'numbers': phone_number
-        }
-        headers = {
-            'authorization': FAST2SMS_API_KEY,
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        response = requests.post(FAST2SMS_URL, data=payload, headers=headers)
-        return response.json()
+        notifier.enqueue_sms(phone_number, message)
+        return True
     except Exception as e:
-        print(f"Error sending SMS: {str(e)}")
-        return None
+        print(f"Error queueing SMS: {str(e)}")
+        return False
 
 def send_email(to_email, subject, body, attachment=None):
+    """Queue an email in the notification outbox; delivered in the background once the caller commits"""
     try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USERNAME
-        msg['To'] = to_email
-        msg['Subject'] = subject
-
-        msg.attach(MIMEText(body, 'plain'))
-
-        if attachment:
-            part = MIMEApplication(attachment, Name="invoice.pdf")
-            part['Content-Disposition'] = f'attachment; filename="invoice.pdf"'
-            msg.attach(part)
-
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        notifier.enqueue_email(to_email, subject, body, attachment=attachment, attachment_name='invoice.pdf')
         return True
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
+        print(f"Error queueing email: {str(e)}")
         return False
 
 from generate_invoice import InvoiceGenerator
 
-# Initialize the invoice generator
-invoice_generator = InvoiceGenerator()
+# Initialize the invoice generator ('vector' draws QR codes without PIL)
+invoice_generator = InvoiceGenerator(qr_mode=os.getenv('INVOICE_QR_MODE', 'raster'))
+render_profiler = init_render_profiler(app, invoice_generator)
+notifier = init_notifications(app, render_pdf=invoice_generator.generate_invoice_pdf)
 
 @app.route('/generate_invoice', methods=['POST'])
 @login_required
 def generate_invoice():
     try:
-        cart = session.get('cart', [])
+        cart_id = session.get('cart_id')
+        cart = list(cart_store.get(cart_id).values()) if cart_id else []
         if not cart:
             flash('Please add items to the invoice first', 'error')
             return redirect(url_for('create_invoice'))
 
         # Calculate totals
-        total_amount = sum(item.get('total', 0) for item in cart)
-        total_gst = sum(item.get('gst_amount', 0) for item in cart)
-        subtotal = total_amount - total_gst
+        total_amount = sum((item['total'] for item in cart), ZERO)
+        total_gst = sum((item['gst_amount'] for item in cart), ZERO)
 
         # Create new invoice
         invoice = Invoice(
@@ -222,72 +260,47 @@ def generate_invoice():
         db.session.add(invoice)
         db.session.flush()
 
-        # Add invoice items
-        for item in cart:
-            # Verify product exists and is not hidden
-            product = Product.query.filter_by(id=item['id'], hidden=False).first()
-            if not product:
-                db.session.rollback()
-                flash(f'Product {item["name"]} is no longer available', 'error')
-                return redirect(url_for('create_invoice'))
-
-            if product.quantity < item['qty']:
-                db.session.rollback()
-                flash(f'Insufficient stock for {product.name}', 'error')
-                return redirect(url_for('create_invoice'))
+        # Reserve stock for every line at once; rolls back the invoice if any line fails
+        try:
+            reserve_stock({item['id']: item['qty'] for item in cart})
+        except StockReservationError as e:
+            db.session.rollback()
+            names = ', '.join(item['name'] for item in cart if item['id'] in e.product_ids)
+            if e.unavailable:
+                flash(f'Product {names} is no longer available', 'error')
+            else:
+                flash(f'Insufficient stock for {names}', 'error')
+            return redirect(url_for('create_invoice'))
 
-            invoice_item = InvoiceItem(
+        # Add invoice items
+        items = [
+            InvoiceItem(
                 invoice_id=invoice.id,
                 product_id=item['id'],
                 product_name=item['name'],
                 quantity=item['qty'],
-                unit_price=float(item['price']),
-                gst_rate=float(item['gst_rate']),
-                subtotal=float(item['subtotal']),
-                gst_amount=float(item['gst_amount']),
-                total=float(item['total'])
+                unit_price=item['price'],
+                gst_rate=item['gst_rate'],
+                subtotal=item['subtotal'],
+                gst_amount=item['gst_amount'],
+                total=item['total']
             )
-            db.session.add(invoice_item)
-
-            # Update product stock
-            product.quantity -= item['qty']
-            db.session.add(product)
-
-        try:
-            # Generate PDF
-            pdf_data = invoice_generator.generate_invoice_pdf(invoice.id)
-            
-            if not pdf_data:
-                raise ValueError("PDF generation failed - no data returned")
-
-            # Save PDF to database
-            invoice_pdf = InvoicePDF(
-                invoice_id=invoice.id,
-                pdf_data=pdf_data,
-                file_name=f"invoice_{invoice.invoice_number}.pdf",
-                file_size=len(pdf_data)
-            )
-            db.session.add(invoice_pdf)
+            for item in cart
+        ]
+        db.session.add_all(items)
 
-            # Clear the cart
-            session.pop('cart', None)
+        # Update the dashboard aggregates in the same transaction
+        record_invoice(invoice, items)
 
-            # Commit all changes
-            db.session.commit()
+        # Commit the invoice now; the PDF is rendered in the background
+        db.session.commit()
 
-            # Return the PDF for download
-            return send_file(
-                BytesIO(pdf_data),
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name=f"invoice_{invoice.invoice_number}.pdf"
-            )
+        # Clear the cart
+        cart_store.clear(cart_id)
+        render_queue.submit(invoice.id, invoice_generator.generate_invoice_pdf)
 
-        except Exception as pdf_error:
-            db.session.rollback()
-            app.logger.error(f"PDF generation failed: {str(pdf_error)}")
-            flash('Error generating PDF. Please try again.', 'error')
-            return redirect(url_for('create_invoice'))
+        flash(f'Invoice {invoice.invoice_number} created successfully!', 'success')
+        return redirect(url_for('download_invoice', invoice_number=invoice.invoice_number))
 
     except Exception as e:
         db.session.rollback()
@@ -312,30 +325,28 @@ def download_invoice(invoice_number):
             flash('Unauthorized access', 'danger')
             return redirect(url_for('view_invoices'))
 
-        # Get or generate PDF
+        # Serve the stored PDF, or report the status of its background render
         invoice_pdf = InvoicePDF.query.filter_by(invoice_id=invoice.id).first()
         if not invoice_pdf:
-            try:
-                # Generate new PDF if it doesn't exist
-                pdf_data = invoice_generator.generate_invoice_pdf(invoice.id)
-                if not pdf_data:
-                    raise ValueError("PDF generation failed - no data returned")
-            except Exception as pdf_error:
-                app.logger.error(f"PDF generation failed for invoice {invoice_number}: {str(pdf_error)}")
+            render_status = render_queue.status(invoice.id)
+            if render_status == 'failed':
+                app.logger.error(f"PDF generation failed for invoice {invoice_number}: {render_queue.error(invoice.id)}")
                 flash('Error generating PDF. Please try regenerating the invoice.', 'danger')
                 return redirect(url_for('view_invoices'))
-        else:
-            pdf_data = invoice_pdf.pdf_data
+
+            if render_status is None:
+                # Queue a render if the PDF doesn't exist yet
+                render_queue.submit(invoice.id, invoice_generator.generate_invoice_pdf)
+            return render_template('invoice_rendering.html', invoice=invoice), 202
 
         # Validate PDF data
-        if not pdf_data or len(pdf_data) < 100:  # Basic size check
+        if invoice_pdf.file_size < 100 or not pdf_storage.exists(invoice_pdf.content_hash):  # Basic size check
             app.logger.error(f"Invalid PDF data for invoice {invoice_number}")
             flash('Invalid PDF data. Please try regenerating the invoice.', 'danger')
             return redirect(url_for('view_invoices'))
 
-        return send_file(
-            BytesIO(pdf_data),
-            mimetype='application/pdf',
+        return send_stored_pdf(
+            invoice_pdf,
             as_attachment=True,
             download_name=f"invoice_{invoice.invoice_number}.pdf"
         )
@@ -380,13 +391,20 @@ def regenerate_invoice(invoice_number):
 @app.route('/invoices')
 @login_required
 def view_invoices():
-    invoices = Invoice.query.filter_by(user_id=current_user.id).order_by(Invoice.date.desc()).all()
-    return render_template('invoices.html', invoices=invoices)
+    try:
+        invoices, next_cursor = paginate_invoices(
+            Invoice.query, current_user.id, request.args.get('cursor'), app.config['INVOICES_PER_PAGE']
+        )
+    except ValueError:
+        flash('Invalid page link', 'danger')
+        return redirect(url_for('view_invoices'))
+    return render_template('invoices.html', invoices=invoices, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('cursor'))
 
 @app.route('/invoice/<int:invoice_id>')
 @login_required
 def view_invoice(invoice_id):
-    invoice = Invoice.query.get_or_404(invoice_id)
+    invoice = Invoice.query.options(INVOICE_WITH_ITEMS).get_or_404(invoice_id)
     if invoice.user_id != current_user.id:
         flash('Unauthorized access', 'danger')
         return redirect(url_for('index'))
@@ -398,7 +416,7 @@ def add_product():
     if request.method == 'POST':
         try:
             name = request.form['name']
-            price = float(request.form['price'])
+            price = to_money(request.form['price'])
             gst_rate = float(request.form['gst_rate'])
             quantity = int(request.form['quantity'])
             hidden = 'hidden' in request.form
@@ -413,6 +431,27 @@ def add_product():
             return redirect(url_for('add_product'))
     return render_template('add_product.html')
 
+@app.route('/import_products', methods=['GET', 'POST'])
+@login_required
+def import_products_route():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a file to import', 'danger')
+            return redirect(url_for('import_products_route'))
+        dry_run = 'dry_run' in request.form
+        try:
+            # Read the upload as a text stream instead of loading it into memory
+            stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            report = import_products(stream, import_format=detect_format(upload.filename),
+                                     dry_run=dry_run, max_errors=100)
+        except Exception as e:
+            flash(f'Error importing products: {str(e)}', 'danger')
+            return redirect(url_for('import_products_route'))
+        flash(report.summary(), 'warning' if report.error_count else 'success')
+        return render_template('import_products.html', report=report, dry_run=dry_run)
+    return render_template('import_products.html')
+
 @app.route('/edit_product/<int:product_id>', methods=['GET', 'POST'])
 @login_required
 def edit_product(product_id):
@@ -420,7 +459,7 @@ def edit_product(product_id):
     if request.method == 'POST':
         try:
             product.name = request.form['name']
-            product.price = float(request.form['price'])
+            product.price = to_money(request.form['price'])
             product.gst_rate = float(request.form['gst_rate'])
             product.quantity = int(request.form['quantity'])
             product.hidden = 'hidden' in request.form
@@ -484,7 +523,11 @@ def generate_token():
 @app.route('/api/invoices', methods=['GET'])
 @token_required
 def api_invoices(current_user):
-    invoices = Invoice.query.filter_by(user_id=current_user.id).all()
+    limit = min(max(request.args.get('limit', app.config['INVOICES_PER_PAGE'], type=int), 1), 200)
+    try:
+        invoices, next_cursor = paginate_invoices(Invoice.query, current_user.id, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return {'message': str(e)}, 400
     return {
         'invoices': [{
             'id': invoice.id,
@@ -493,13 +536,14 @@ def api_invoices(current_user):
             'total': invoice.total_amount,
             'payment_status': invoice.status,
             'payment_method': invoice.payment_method
-        } for invoice in invoices]
+        } for invoice in invoices],
+        'next_cursor': next_cursor
     }
 
 @app.route('/api/invoice/<int:invoice_id>', methods=['GET'])
 @token_required
 def api_invoice(current_user, invoice_id):
-    invoice = Invoice.query.get_or_404(invoice_id)
+    invoice = Invoice.query.options(INVOICE_WITH_ITEM_PRODUCTS).get_or_404(invoice_id)
     if invoice.user_id != current_user.id:
         return {'message': 'Unauthorized access'}, 403
     
@@ -514,7 +558,7 @@ def api_invoice(current_user, invoice_id):
             'items': [{
                 'product_name': item.product.name,
                 'quantity': item.quantity,
-                'price': item.price,
+                'price': item.unit_price,
                 'subtotal': item.subtotal
             } for item in invoice.items]
         }
@@ -525,11 +569,6 @@ def send_email_notification(email, invoice):
         return False
     
     try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USERNAME
-        msg['To'] = email
-        msg['Subject'] = f"Invoice #{invoice.invoice_number} - Your Store Name"
-
         # Create email body
         body = f"""
         Dear Customer,
@@ -547,26 +586,16 @@ def send_email_notification(email, invoice):
         Your Store Name
         """
 
-        msg.attach(MIMEText(body, 'plain'))
-
-        # Generate PDF using the invoice generator
-        pdf_data = invoice_generator.generate_invoice_pdf(invoice.id, include_qr=True)
-        
-        # Attach PDF to email
-        pdf_attachment = MIMEApplication(pdf_data, _subtype="pdf")
-        pdf_attachment.add_header('Content-Disposition', 'attachment', 
-                                filename=f'invoice_{invoice.invoice_number}.pdf')
-        msg.attach(pdf_attachment)
-
-        # Send email
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            server.send_message(msg)
-
+        # Queue the email with the caller's transaction; the dispatcher
+        # attaches the invoice's stored PDF
+        notifier.enqueue_email(
+            email, f"Invoice #{invoice.invoice_number} - Your Store Name", body,
+            invoice_id=invoice.id, attachment_name=f'invoice_{invoice.invoice_number}.pdf'
+        )
         return True
 
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
+        print(f"Error queueing email: {str(e)}")
         return False
 
 def send_sms_notification(phone_number, invoice):
@@ -574,212 +603,90 @@ def send_sms_notification(phone_number, invoice):
         return False
     
     try:
-        url = "https://www.fast2sms.com/dev/bulkV2"
-        payload = {
-            "route": "v3",
-            "sender_id": "FTWSMS",
-            "message": f"Thank you for your purchase! Invoice #{invoice.invoice_number} has been generated. Total amount: ₹{invoice.total_amount * 1.18:.2f}",
-            "language": "english",
-            "flash": 0,
-            "numbers": phone_number
-        }
-        headers = {
-            "authorization": FAST2SMS_API_KEY,
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(url, json=payload, headers=headers)
-        return response.json().get('return', False)
+        notifier.enqueue_sms(
+            phone_number,
+            f"Thank you for your purchase! Invoice #{invoice.invoice_number} has been generated. "
+            f"Total amount: ₹{invoice.total_amount:.2f}"
+        )
+        return True
     
     except Exception as e:
-        print(f"Error sending SMS: {str(e)}")
+        print(f"Error queueing SMS: {str(e)}")
         return False
 
-def generate_invoice_pdf(invoice, items):
-    """Generate a professional PDF invoice using SQLite data"""
-    conn = sqlite3.connect('instance/billing_system.db')
-    cursor = conn.cursor()
-
-    # Fetch invoice details
-    cursor.execute("""
-        SELECT i.id, i.invoice_number, i.customer_name, i.customer_address, 
-               i.customer_gstin, i.customer_phone, i.date, i.payment_method,
-               i.subtotal, i.gst_amount, i.total
-        FROM invoice i
-        WHERE i.id = ?
-    """, (invoice.id,))
-    invoice_details = cursor.fetchone()
-
-    if not invoice_details:
-        print("Invoice not found")
-        return None
-
-    # Fetch invoice items
-    cursor.execute("""
-        SELECT p.name, ii.quantity, ii.unit_price, ii.gst_rate, ii.total
-        FROM invoice_item ii
-        JOIN product p ON ii.product_id = p.id
-        WHERE ii.invoice_id = ?
-    """, (invoice.id,))
-    existing_items = cursor.fetchall()
-
-    conn.close()
-
-    # Generate PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='RightAlign', alignment=2))
-    styles.add(ParagraphStyle(name='CenterAlign', alignment=1))
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        fontSize=24,
-        spaceAfter=30,
-        alignment=1
-    ))
-    
-    # Add company logo/header
-    elements.append(Paragraph("Your Store Name", styles['CustomTitle']))
-    
-    # Add company details
-    company_info = [
-        "123 Business Street, City, State - 123456",
-        "GSTIN: 12ABCDE1234F1Z5",
-        "Phone: +91 9876543210",
-        "Email: contact@company.com",
-        "Website: www.yourcompany.com"
-    ]
-    for info in company_info:
-        elements.append(Paragraph(info, styles['CenterAlign']))
-    
-    elements.append(Spacer(1, 20))
-    
-    # Add invoice header
-    invoice_header = [
-        [Paragraph(f"<b>Invoice #{invoice_details[1]}</b>", styles['RightAlign']),
-         Paragraph(f"<b>Date:</b> {invoice_details[6].strftime('%d-%m-%Y')}", styles['RightAlign'])],
-    ]
-    invoice_header_table = Table(invoice_header, colWidths=[doc.width/2]*2)
-    invoice_header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 20),
-    ]))
-    elements.append(invoice_header_table)
-    elements.append(Spacer(1, 20))
-    
-    # Add billing details
-    billing_data = [
-        ["BILL TO:", "SHIP TO:"],
-        [invoice_details[2], invoice_details[2]],  # Customer name
-        [invoice_details[3], invoice_details[3]],  # Address
-        [f"GSTIN: {invoice_details[4]}", ""],
-        [f"Phone: {invoice_details[5]}", ""],
-    ]
-    billing_table = Table(billing_data, colWidths=[doc.width/2]*2)
-    billing_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
-    elements.append(billing_table)
-    elements.append(Spacer(1, 20))
-    
-    # Add items table
-    table_data = [["Item", "Quantity", "Unit Price", "GST Rate", "Total"]]
-    for item in items:
-        table_data.append([
-            item['name'],
-            str(item['quantity']),
-            f"₹{item['price']:.2f}",
-            f"{item['gst_rate']}%",
-            f"₹{item['total']:.2f}"
-        ])
-    
-    # Add totals
-    table_data.extend([
-        ["", "", "", "Subtotal:", f"₹{invoice_details[8]:.2f}"],
-        ["", "", "", "GST:", f"₹{invoice_details[9]:.2f}"],
-        ["", "", "", "Total:", f"₹{invoice_details[10]:.2f}"]
-    ])
-    
-    # Create items table
-    items_table = Table(table_data, colWidths=[doc.width/3, doc.width/6, doc.width/6, doc.width/6, doc.width/6])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -3), (-1, -1), colors.lightgrey),
-        ('FONTNAME', (0, -3), (-1, -1), 'Helvetica-Bold'),
-        ('ALIGN', (-2, -3), (-1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
-    elements.append(items_table)
-    elements.append(Spacer(1, 20))
-    
-    # Add payment details
-    payment_info = [
-        [Paragraph("<b>Payment Method:</b>", styles['Normal']), invoice_details[7]],
-        [Paragraph("<b>Payment Status:</b>", styles['Normal']), "Paid"],
-    ]
-    payment_table = Table(payment_info, colWidths=[doc.width/4, doc.width*3/4])
-    payment_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
-    elements.append(payment_table)
-    elements.append(Spacer(1, 20))
-    
-    # Add terms and conditions
-    elements.append(Paragraph("<b>Terms and Conditions:</b>", styles['Normal']))
-    terms = [
-        "1. Payment is due within 30 days",
-        "2. Please include invoice number in payment reference",
-        "3. For any queries, contact accounts@company.com",
-        "4. Goods once sold cannot be returned",
-        "5. All disputes are subject to local jurisdiction"
-    ]
-    for term in terms:
-        elements.append(Paragraph(term, styles['Normal']))
-    
-    # Add footer
-    elements.append(Spacer(1, 30))
-    elements.append(Paragraph("Thank you for your business!", styles['CenterAlign']))
-    elements.append(Paragraph("This is a computer-generated invoice. No signature required.", styles['CenterAlign']))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
-
 @app.route('/invoice_history')
 @login_required
 def invoice_history():
-    # Get all invoices for the current user with their PDFs
-    invoices = Invoice.query.filter_by(user_id=current_user.id).order_by(Invoice.date.desc()).all()
-    
+    # Get one page of the current user's invoices
+    try:
+        invoices, next_cursor = paginate_invoices(
+            Invoice.query, current_user.id, request.args.get('cursor'), app.config['INVOICES_PER_PAGE']
+        )
+    except ValueError:
+        flash('Invalid page link', 'danger')
+        return redirect(url_for('invoice_history'))
+
+    # Load the PDF metadata for the page's invoices in a single query
+    pdfs_by_invoice = {}
+    pdfs = InvoicePDF.query.options(
+        load_only(InvoicePDF.id, InvoicePDF.invoice_id, InvoicePDF.file_size, InvoicePDF.created_at)
+    ).filter(
+        InvoicePDF.invoice_id.in_([invoice.id for invoice in invoices])
+    ).order_by(InvoicePDF.created_at.desc()).all()
+    for pdf in pdfs:
+        pdfs_by_invoice.setdefault(pdf.invoice_id, []).append(pdf)
+
     # Prepare data for template
     invoice_data = []
     for invoice in invoices:
-        pdfs = InvoicePDF.query.filter_by(invoice_id=invoice.id).order_by(InvoicePDF.created_at.desc()).all()
         invoice_data.append({
             'invoice': invoice,
-            'pdfs': pdfs
+            'pdfs': pdfs_by_invoice.get(invoice.id, [])
         })
     
-    return render_template('invoice_history.html', invoice_data=invoice_data)
+    return render_template('invoice_history.html', invoice_data=invoice_data, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('cursor'))
+
+@app.route('/export_invoices')
+@login_required
+def export_invoices_route():
+    """Stream the current user's invoices and line items as CSV or JSON Lines"""
+    export_format = request.args.get('format', 'csv')
+    try:
+        start = parse_date(request.args.get('start'))
+        end = parse_date(request.args.get('end'))
+        chunks = export_invoices(export_format, user_id=current_user.id, start=start, end=end)
+    except ValueError as e:
+        flash(f'Invalid export request: {str(e)}', 'danger')
+        return redirect(url_for('invoice_history'))
+
+    file_name = f"invoices_{start.date() if start else 'all'}_{end.date() if end else 'latest'}.{export_format}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={file_name}'}
+    )
+
+@app.route('/gst_report')
+@login_required
+def gst_report():
+    """GST totals by month, rate and customer GSTIN for the current user's invoices"""
+    try:
+        start = parse_date(request.args.get('start'))
+        end = parse_date(request.args.get('end'))
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format', 'danger')
+        return redirect(url_for('gst_report'))
+
+    report = gst_summary(user_id=current_user.id, start=start, end=end)
+    if request.args.get('format') == 'csv':
+        return Response(
+            report_csv(report),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=gst_report.csv'}
+        )
+    return render_template('gst_report.html', report=report, start=request.args.get('start', ''),
+                           end=request.args.get('end', ''))
 
 @app.route('/view_saved_pdf/<int:pdf_id>')
 @login_required
@@ -791,138 +698,35 @@ def view_saved_pdf(pdf_id):
         flash('Unauthorized access', 'danger')
         return redirect(url_for('invoice_history'))
     
-    return send_file(
-        BytesIO(invoice_pdf.pdf_data),
-        download_name=invoice_pdf.file_name,
-        mimetype="application/pdf"
-    )
-
-def create_test_invoice():
-    with app.app_context():
-        # Create test user if not exists
-        test_user = User.query.filter_by(username='test').first()
-        if not test_user:
-            test_user = User(username='test', password='test123')
-            db.session.add(test_user)
-            db.session.commit()
+    return send_stored_pdf(invoice_pdf, download_name=invoice_pdf.file_name)
 
-        # Create test products if not exists
-        if not Product.query.first():
-            products = [
-                Product(name='Mouse', price=500, gst_rate=18),
-                Product(name='Keyboard', price=1000, gst_rate=18),
-                Product(name='Monitor', price=8000, gst_rate=18)
-            ]
-            db.session.add_all(products)
-            db.session.commit()
-
-        # Create test invoice with unique invoice number
-        product = Product.query.filter_by(name='Mouse').first()
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        invoice = Invoice(
-            invoice_number=f'TEST{timestamp}',
-            customer_name='Test Customer',
-            customer_address='Test Address',
-            customer_gstin='TESTGSTIN123',
-            customer_phone='1234567890',
-            payment_method='Cash',
-            user_id=test_user.id
-        )
-        db.session.add(invoice)
-        db.session.commit()
-
-        # Add invoice item
-        invoice_item = InvoiceItem(
-            invoice_id=invoice.id,
-            product_id=product.id,
-            quantity=2,
-            unit_price=product.price,
-            gst_rate=product.gst_rate
+def send_stored_pdf(invoice_pdf, as_attachment=False, download_name=None):
+    """Send a stored PDF straight from disk when the storage backend allows it"""
+    path = pdf_storage.path(invoice_pdf.content_hash)
+    if path is not None:
+        return send_file(
+            path,
+            mimetype='application/pdf',
+            as_attachment=as_attachment,
+            download_name=download_name
         )
-        db.session.add(invoice_item)
-        db.session.commit()
-
-        # Generate PDF
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer)
-        
-        # Add company header
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, 800, "Your Company Name")
-        p.setFont("Helvetica", 12)
-        p.drawString(50, 780, "123 Business Street")
-        p.drawString(50, 760, "City, State - 123456")
-        p.drawString(50, 740, "GSTIN: 12ABCDE1234F1Z5")
-        p.drawString(50, 720, "Phone: +91 9876543210")
-
-        # Add invoice details
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(400, 800, f"Invoice #{invoice.invoice_number}")
-        p.setFont("Helvetica", 12)
-        p.drawString(400, 780, f"Date: {invoice.date.strftime('%d-%m-%Y')}")
-
-        # Add customer details
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, 680, "Bill To:")
-        p.setFont("Helvetica", 12)
-        p.drawString(50, 660, invoice.customer_name)
-        p.drawString(50, 640, invoice.customer_address)
-        p.drawString(50, 620, f"GSTIN: {invoice.customer_gstin}")
-        p.drawString(50, 600, f"Phone: {invoice.customer_phone}")
-
-        # Add items table
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, 560, "Item")
-        p.drawString(200, 560, "Quantity")
-        p.drawString(300, 560, "Unit Price")
-        p.drawString(400, 560, "GST Rate")
-        p.drawString(500, 560, "Total")
-
-        y = 540
-        for item in invoice.items:
-            p.setFont("Helvetica", 12)
-            p.drawString(50, y, item.product.name)
-            p.drawString(200, y, str(item.quantity))
-            p.drawString(300, y, f"₹{item.unit_price}")
-            p.drawString(400, y, f"{item.gst_rate}%")
-            p.drawString(500, y, f"₹{item.total}")
-            y -= 20
-
-        # Add totals
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(400, y-20, f"Subtotal: ₹{invoice.subtotal:.2f}")
-        p.drawString(400, y-40, f"GST: ₹{invoice.gst_amount:.2f}")
-        p.drawString(400, y-60, f"Total: ₹{invoice.total:.2f}")
-
-        # Add payment method and status
-        p.drawString(50, y-100, f"Payment Method: {invoice.payment_method}")
-        p.drawString(50, y-120, "Status: Paid")
-
-        # Add terms and conditions
-        p.setFont("Helvetica", 10)
-        p.drawString(50, y-160, "Terms and Conditions:")
-        p.drawString(50, y-180, "1. Payment is due within 30 days")
-        p.drawString(50, y-200, "2. Please include invoice number in payment reference")
-        p.drawString(50, y-220, "3. For any queries, contact accounts@company.com")
-
-        p.save()
-        buffer.seek(0)
-
-        # Save PDF to file
-        with open('test_invoice.pdf', 'wb') as f:
-            f.write(buffer.getvalue())
-
-        return 'Test invoice generated and saved as test_invoice.pdf'
+    return send_file(
+        BytesIO(pdf_storage.read(invoice_pdf.content_hash)),
+        mimetype='application/pdf',
+        as_attachment=as_attachment,
+        download_name=download_name
+    )
 
 @app.route('/create_invoice')
 @login_required
 def create_invoice():
     products = Product.query.all()
-    cart = session.get('cart', [])
+    cart_id = session.get('cart_id')
+    cart = list(cart_store.get(cart_id).values()) if cart_id else []
     
     # Initialize totals
-    total_amount = 0
-    total_gst = 0
+    total_amount = ZERO
+    total_gst = ZERO
     
     # Calculate totals from cart
     for item in cart:
@@ -938,6 +742,7 @@ def create_invoice():
 def create_tables():
     with app.app_context():
         db.create_all()
+        product_search.create_index()
         # Create admin user if it doesn't exist
         if not User.query.filter_by(username='admin').first():
             admin = User(username='admin')
@@ -950,20 +755,8 @@ def create_tables():
 create_tables()
 
 def generate_invoice_number():
-    """Generate a unique invoice number based on the current year and a sequential number"""
-    current_year = datetime.now().year
-    last_invoice = Invoice.query.filter(
-        Invoice.invoice_number.like(f'INV{current_year}-%')
-    ).order_by(Invoice.id.desc()).first()
-
-    if last_invoice:
-        # Extract the sequential number from the last invoice number
-        last_seq = int(last_invoice.invoice_number.split('-')[1])
-        next_seq = last_seq + 1
-    else:
-        next_seq = 1
-
-    return f'INV{current_year}-{str(next_seq).zfill(4)}'
+    """Allocate the next sequential invoice number for the current year"""
+    return invoice_number_allocator.next_number()
 
 @app.route('/test_invoice')
 @login_required
@@ -980,6 +773,7 @@ def test_invoice():
             )
             db.session.add(product)
             db.session.commit()
+        subtotal, gst_amount, total = line_amounts(product.price, 1, product.gst_rate)
 
         # Create test invoice data
         invoice_data = {
@@ -988,17 +782,17 @@ def test_invoice():
             'customer_gstin': 'TEST1234567890',
             'customer_phone': '9876543210',
             'payment_method': 'Cash',
-            'total_amount': 1180.00,  # 1000 + 18% GST
-            'total_gst': 180.00,
+            'total_amount': total,
+            'total_gst': gst_amount,
             'items': [{
                 'product_id': product.id,
                 'name': product.name,
                 'quantity': 1,
                 'price': product.price,
                 'gst_rate': product.gst_rate,
-                'subtotal': product.price,
-                'gst_amount': (product.price * product.gst_rate / 100),
-                'total': product.price * (1 + product.gst_rate / 100)
+                'subtotal': subtotal,
+                'gst_amount': gst_amount,
+                'total': total
             }]
         }
 
@@ -1026,11 +820,11 @@ def test_invoice():
                 product_id=item['product_id'],
                 product_name=item['name'],
                 quantity=item['quantity'],
-                unit_price=float(item['price']),
-                gst_rate=float(item['gst_rate']),
-                subtotal=float(item['subtotal']),
-                gst_amount=float(item['gst_amount']),
-                total=float(item['total'])
+                unit_price=item['price'],
+                gst_rate=item['gst_rate'],
+                subtotal=item['subtotal'],
+                gst_amount=item['gst_amount'],
+                total=item['total']
             )
             db.session.add(invoice_item)
 
@@ -1143,13 +937,11 @@ def test_product_and_invoice():
         }
 
         # Add items to invoice
-        total_amount = 0
-        total_gst = 0
+        total_amount = ZERO
+        total_gst = ZERO
         for product in Product.query.all():
             quantity = 1
-            subtotal = product.price * quantity
-            gst_amount = subtotal * (product.gst_rate / 100)
-            total = subtotal + gst_amount
+            subtotal, gst_amount, total = line_amounts(product.price, quantity, product.gst_rate)
             
             total_amount += total
             total_gst += gst_amount
@@ -1192,11 +984,11 @@ def test_product_and_invoice():
                 product_id=item['product_id'],
                 product_name=item['name'],
                 quantity=item['quantity'],
-                unit_price=float(item['price']),
-                gst_rate=float(item['gst_rate']),
-                subtotal=float(item['subtotal']),
-                gst_amount=float(item['gst_amount']),
-                total=float(item['total'])
+                unit_price=item['price'],
+                gst_rate=item['gst_rate'],
+                subtotal=item['subtotal'],
+                gst_amount=item['gst_amount'],
+                total=item['total']
             )
             db.session.add(invoice_item)
 
@@ -1264,13 +1056,11 @@ def test_invoice_download():
         }
 
         # Add items to invoice
-        total_amount = 0
-        total_gst = 0
+        total_amount = ZERO
+        total_gst = ZERO
         for product in Product.query.all():
             quantity = 1
-            subtotal = product.price * quantity
-            gst_amount = subtotal * (product.gst_rate / 100)
-            total = subtotal + gst_amount
+            subtotal, gst_amount, total = line_amounts(product.price, quantity, product.gst_rate)
             
             total_amount += total
             total_gst += gst_amount
@@ -1313,11 +1103,11 @@ def test_invoice_download():
                 product_id=item['product_id'],
                 product_name=item['name'],
                 quantity=item['quantity'],
-                unit_price=float(item['price']),
-                gst_rate=float(item['gst_rate']),
-                subtotal=float(item['subtotal']),
-                gst_amount=float(item['gst_amount']),
-                total=float(item['total'])
+                unit_price=item['price'],
+                gst_rate=item['gst_rate'],
+                subtotal=item['subtotal'],
+                gst_amount=item['gst_amount'],
+                total=item['total']
             )
             db.session.add(invoice_item)
 
@@ -1339,6 +1129,12 @@ def test_invoice_download():
         db.session.rollback()
         return f'Error generating test invoice: {str(e)}', 500
 
+def get_cart_id():
+    """Return the current session's cart id, creating one if needed"""
+    if 'cart_id' not in session:
+        session['cart_id'] = uuid.uuid4().hex
+    return session['cart_id']
+
 @app.route('/add_to_invoice', methods=['POST'])
 @login_required
 def add_to_invoice():
@@ -1346,26 +1142,20 @@ def add_to_invoice():
     product = Product.query.get(product_id)
     
     if product and not product.hidden:
-        # Session-based cart
-        cart = session.get('cart', [])
-        
-        # Check if product already in cart
-        existing_item = next((item for item in cart if item['id'] == product.id), None)
-        if existing_item:
-            existing_item['qty'] += 1
-        else:
-            cart.append({
+        # Server-side cart; the session only holds the cart id
+        cart_id = get_cart_id()
+        line = cart_store.get_line(cart_id, product.id)
+        if not line:
+            line = {
                 'id': product.id,
                 'name': product.name,
-                'price': float(product.price),
-                'gst_rate': float(product.gst_rate),
-                'qty': 1,
-                'subtotal': float(product.price),
-                'gst_amount': float(product.price) * float(product.gst_rate) / 100,
-                'total': float(product.price) * (1 + float(product.gst_rate) / 100)
-            })
-        
-        session['cart'] = cart
+                'price': product.price,
+                'gst_rate': product.gst_rate,
+                'qty': 0
+            }
+        line['qty'] += 1
+        line['subtotal'], line['gst_amount'], line['total'] = line_amounts(line['price'], line['qty'], line['gst_rate'])
+        cart_store.set_line(cart_id, line)
         flash('Product added to invoice', 'success')
     else:
         flash('Product not found or hidden', 'error')
@@ -1376,9 +1166,7 @@ def add_to_invoice():
 @login_required
 def remove_from_invoice():
     product_id = request.form.get('product_id')
-    cart = session.get('cart', [])
-    cart = [item for item in cart if item['id'] != int(product_id)]
-    session['cart'] = cart
+    cart_store.remove_line(get_cart_id(), int(product_id))
     flash('Product removed from invoice', 'success')
     return redirect(url_for('create_invoice'))
 
@@ -1391,17 +1179,15 @@ def update_quantity():
     if quantity < 1:
         return jsonify({'error': 'Quantity must be at least 1'}), 400
         
-    cart = session.get('cart', [])
-    for item in cart:
-        if item['id'] == int(product_id):
-            product = Product.query.get(product_id)
-            if product:
-                item['qty'] = quantity
-                item['subtotal'] = float(product.price) * quantity
-                item['gst_amount'] = item['subtotal'] * float(product.gst_rate) / 100
-                item['total'] = item['subtotal'] + item['gst_amount']
-                
-    session['cart'] = cart
+    cart_id = get_cart_id()
+    item = cart_store.get_line(cart_id, int(product_id))
+    if item:
+        product = Product.query.get(product_id)
+        if product:
+            item['qty'] = quantity
+            item['subtotal'], item['gst_amount'], item['total'] = line_amounts(product.price, quantity, product.gst_rate)
+            cart_store.set_line(cart_id, item)
+
     return jsonify({'success': True})
 
 if __name__ == '__main__':
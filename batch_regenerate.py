@@ -0,0 +1,194 @@
+"""Regenerate invoice PDFs in parallel.
+
+Streams invoices in id-ordered chunks, renders each chunk on a process pool
+(ReportLab rendering is CPU-bound) and writes the results back with one
+commit per chunk. Progress is checkpointed after every chunk so an
+interrupted run can continue with --resume; a run with failures keeps its
+checkpoint, and --resume renders the failed invoices again first:
+
+    python batch_regenerate.py --workers 4 --chunk-size 500
+    python batch_regenerate.py --workers 4 --resume
+
+Invoices whose stored PDF still matches their fingerprint are not rendered
+again unless --force is given.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from models import db, Invoice, InvoiceItem, Product, INVOICE_WITH_ITEMS
+from generate_invoice import InvoiceGenerator, InvoiceSnapshot, is_current, save_pdf_records, stored_pdfs
+from pdf_storage import get_pdf_storage
+
+# Per-process state for pool workers, set up by _init_worker
+_worker = {}
+
+
+def _init_worker(storage, include_qr, qr_mode):
+    _worker['generator'] = InvoiceGenerator(qr_mode=qr_mode)
+    _worker['storage'] = storage
+    _worker['include_qr'] = include_qr
+
+
+def _render_batch(invoices):
+    """Render and store a batch of invoices in a worker process.
+
+    Returns (invoice_id, content_hash, file_size, error) tuples so only the
+    storage keys travel back to the parent, not the PDF bytes.
+    """
+    results = []
+    for invoice in invoices:
+        try:
+            pdf_data = _worker['generator'].render(invoice, include_qr=_worker['include_qr'])
+            content_hash = _worker['storage'].save(pdf_data)
+            results.append((invoice.id, content_hash, len(pdf_data), None))
+        except Exception as e:
+            results.append((invoice.id, None, 0, str(e)))
+    return results
+
+
+def _split(items, parts):
+    size = max(1, -(-len(items) // parts))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _new_stats():
+    return {'success': 0, 'failure': 0, 'skipped': 0, 'unchanged': 0}
+
+
+def load_checkpoint(path):
+    """Return (last_invoice_id, stats, failed_ids) of a checkpoint, or a fresh start"""
+    if not path or not os.path.exists(path):
+        return 0, _new_stats(), []
+    with open(path) as f:
+        checkpoint = json.load(f)
+    stats = _new_stats()
+    stats.update(checkpoint.get('stats', {}))
+    return checkpoint.get('last_invoice_id', 0), stats, checkpoint.get('failed_ids', [])
+
+
+def save_checkpoint(path, last_invoice_id, stats, failed_ids=()):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'last_invoice_id': last_invoice_id, 'stats': stats, 'failed_ids': list(failed_ids)}, f)
+    os.replace(tmp_path, path)
+
+
+def regenerate_invoices_parallel(workers=None, chunk_size=500, checkpoint=None, resume=False,
+                                 include_qr=True, qr_mode='raster', force=False, log=print):
+    """Regenerate every invoice PDF on a process pool; returns the run statistics"""
+    workers = workers or os.cpu_count() or 1
+    last_id, stats, retry_ids = load_checkpoint(checkpoint) if resume else (0, _new_stats(), [])
+    # Invoices that failed in the interrupted run are counted again when retried
+    stats['failure'] -= len(retry_ids)
+    failures = []
+
+    done_before = sum(stats.values())
+    total = done_before + len(retry_ids) + Invoice.query.filter(Invoice.id > last_id).count()
+    log(f"Regenerating {total - done_before - len(retry_ids)} invoices after id {last_id} and "
+        f"{len(retry_ids)} that failed before with {workers} workers")
+    started = time.monotonic()
+    storage = get_pdf_storage()
+    # Fingerprints are computed here; the workers only render
+    generator = InvoiceGenerator(qr_mode=qr_mode)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(storage, include_qr, qr_mode)) as pool:
+        while True:
+            query = Invoice.query.options(INVOICE_WITH_ITEMS)
+            if retry_ids:
+                retrying, retry_ids = retry_ids[:chunk_size], retry_ids[chunk_size:]
+                chunk = query.filter(Invoice.id.in_(retrying)).order_by(Invoice.id).all()
+            else:
+                chunk = query.filter(Invoice.id > last_id).order_by(Invoice.id).limit(chunk_size).all()
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+
+            # Skip invoices that contain now-hidden products
+            hidden_ids = {
+                invoice_id for (invoice_id,) in db.session.query(InvoiceItem.invoice_id)
+                .join(Product).filter(
+                    Product.hidden.is_(True),
+                    InvoiceItem.invoice_id.between(chunk[0].id, chunk[-1].id)
+                ).distinct()
+            } if chunk else set()
+            snapshots = [InvoiceSnapshot.from_invoice(invoice) for invoice in chunk if invoice.id not in hidden_ids]
+            stats['skipped'] += len(chunk) - len(snapshots)
+            existing = stored_pdfs([snapshot.id for snapshot in snapshots])
+            fingerprints = {}
+            payloads = []
+            for snapshot in snapshots:
+                fingerprints[snapshot.id] = generator.fingerprint(snapshot, include_qr)
+                if not force and is_current(existing.get(snapshot.id), fingerprints[snapshot.id], storage):
+                    stats['unchanged'] += 1
+                else:
+                    payloads.append(snapshot)
+
+            results = []
+            for batch_results in pool.map(_render_batch, _split(payloads, workers)):
+                results.extend(batch_results)
+
+            for invoice_id, content_hash, size, error in results:
+                if error:
+                    stats['failure'] += 1
+                    failures.append((invoice_id, error))
+                    log(f"Failed to regenerate invoice {invoice_id}: {error}")
+                else:
+                    stats['success'] += 1
+
+            # One commit per chunk for the rendered invoices' InvoicePDF rows
+            numbers = {invoice.id: invoice.invoice_number for invoice in chunk}
+            save_pdf_records([
+                (invoice_id, numbers[invoice_id], content_hash, size, fingerprints[invoice_id])
+                for invoice_id, content_hash, size, error in results if not error
+            ])
+            db.session.commit()
+            failed_ids = retry_ids + [invoice_id for invoice_id, error in failures]
+            save_checkpoint(checkpoint, last_id, stats, failed_ids)
+            db.session.expunge_all()
+
+            done = sum(stats.values())
+            elapsed = time.monotonic() - started
+            log(f"{done}/{total} invoices ({(done - done_before) / elapsed:.1f}/s), {stats['failure']} failed, "
+                f"{stats['skipped']} skipped, {stats['unchanged']} unchanged, last id {last_id}")
+
+    stats['elapsed'] = round(time.monotonic() - started, 2)
+    stats['failures'] = failures
+    # Keep the checkpoint while there are failures, so --resume can retry them
+    if not failures and checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return stats
+
+
+if __name__ == '__main__':
+    from app import app, INSTANCE_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=None, help='render processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='invoices per chunk and commit')
+    parser.add_argument('--checkpoint', default=os.path.join(INSTANCE_PATH, 'regenerate_checkpoint.json'))
+    parser.add_argument('--resume', action='store_true', help='continue after the last checkpointed invoice')
+    parser.add_argument('--no-qr', action='store_true', help='render without QR codes')
+    parser.add_argument('--force', action='store_true', help='render invoices whose stored PDF is current too')
+    parser.add_argument('--qr-mode', choices=['raster', 'vector'], default=os.getenv('INVOICE_QR_MODE', 'raster'))
+    args = parser.parse_args()
+
+    with app.app_context():
+        stats = regenerate_invoices_parallel(
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            checkpoint=args.checkpoint,
+            resume=args.resume,
+            include_qr=not args.no_qr,
+            qr_mode=args.qr_mode,
+            force=args.force
+        )
+    print(f"Done in {stats['elapsed']}s: {stats['success']} regenerated, "
+          f"{stats['failure']} failed, {stats['skipped']} skipped, {stats['unchanged']} unchanged")
+    if stats['failures']:
+        print("Run again with --resume to retry the failed invoices")
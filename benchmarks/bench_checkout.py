@@ -0,0 +1,124 @@
+"""Load test concurrent checkouts against each database profile.
+
+Seeds a throwaway SQLite database per DB_PROFILE, then runs --workers
+processes (like Gunicorn workers) with --threads threads each, every thread
+adding two products to its cart and posting /generate_invoice in a loop.
+Reports invoices per second, checkout latency and failed checkouts (e.g.
+"database is locked"). Background PDF rendering is skipped unless --render
+is given, so the numbers reflect the database rather than the CPU:
+
+    python benchmarks/bench_checkout.py --workers 4 --threads 4 --checkouts 25
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def configure(profile, workdir):
+    os.environ['DB_PROFILE'] = profile
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, f'{profile}.db')}"
+    os.environ['PDF_STORAGE_DIR'] = os.path.join(workdir, f"{profile}_pdfs")
+    os.environ['NOTIFY_WORKER'] = '0'
+
+
+def seed(profile, workdir, products):
+    configure(profile, workdir)
+    from app import app, db, Product
+
+    with app.app_context():
+        db.session.execute(Product.__table__.insert(), [
+            {'name': f"Product {i}", 'price': 100 + i, 'gst_rate': 18.0, 'quantity': 10 ** 6, 'hidden': False}
+            for i in range(1, products + 1)
+        ])
+        db.session.commit()
+
+
+def run_worker(profile, workdir, threads, checkouts, products, render, start_at, results):
+    configure(profile, workdir)
+    from app import app, render_queue
+
+    app.logger.disabled = True
+    if not render:
+        render_queue.submit = lambda invoice_id, render: None
+    latencies = []
+    failures = []
+
+    def checkout_loop(index):
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin'})
+        for i in range(checkouts):
+            for product_id in (index + i) % products + 1, (index + i + 1) % products + 1:
+                client.post('/add_to_invoice', data={'product_id': product_id})
+            started = time.perf_counter()
+            response = client.post('/generate_invoice', data={
+                'customer_name': 'Load Test', 'customer_address': 'Address', 'payment_method': 'Cash'
+            })
+            elapsed = time.perf_counter() - started
+            if 'download_invoice' in response.headers.get('Location', ''):
+                latencies.append(elapsed)
+            else:
+                failures.append(elapsed)
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+    pool = [threading.Thread(target=checkout_loop, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((latencies, len(failures)))
+
+
+def run_profile(profile, workdir, args):
+    ctx = multiprocessing.get_context('spawn')
+    setup = ctx.Process(target=seed, args=(profile, workdir, args.products))
+    setup.start()
+    setup.join()
+
+    results = ctx.Queue()
+    start_at = time.time() + 5  # let every worker import the app first
+    workers = [
+        ctx.Process(target=run_worker, args=(profile, workdir, args.threads, args.checkouts,
+                                             args.products, args.render, start_at, results))
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    latencies, failures = [], 0
+    for _ in workers:
+        worker_latencies, worker_failures = results.get()
+        latencies += worker_latencies
+        failures += worker_failures
+    elapsed = time.time() - start_at
+    for worker in workers:
+        worker.join()
+    return latencies, failures, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=['default', 'production'])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--checkouts', type=int, default=25, help='checkouts per thread')
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--render', action='store_true', help='also render PDFs in the background')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_checkout_')
+    print(f"{args.workers} workers x {args.threads} threads x {args.checkouts} checkouts")
+    for profile in args.profiles:
+        latencies, failures, elapsed = run_profile(profile, workdir, args)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        median = statistics.median(latencies) if latencies else 0
+        print(f"{profile:<11} {len(latencies) / elapsed:>7.1f} invoices/s  p50 {median * 1000:>7.1f} ms  "
+              f"p95 {p95 * 1000:>7.1f} ms  {failures} failed")
@@ -0,0 +1,101 @@
+"""Benchmark the GST report on a synthetic invoice history.
+
+Seeds a throwaway SQLite database with --items line items spread over a
+year, rates and customers, then times gst_summary with the NumPy reducer
+(when installed) and the pure Python reducer, plus a naive loop over
+Invoice.items for a small sample:
+
+    python benchmarks/bench_gst_report.py --items 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RATES = [0.0, 5.0, 12.0, 18.0, 28.0]
+
+
+def seed_history(db, Invoice, InvoiceItem, Product, user_id, item_count, items_per_invoice=10, seed=42):
+    rng = random.Random(seed)
+    db.session.execute(Product.__table__.insert(), [
+        {'name': f"Product {i}", 'price': 100.0, 'gst_rate': RATES[i % len(RATES)], 'quantity': 0, 'hidden': False}
+        for i in range(1, 101)
+    ])
+    gstins = [''] + [f"33ABCDE{i:04d}F1Z5" for i in range(200)]
+    start = datetime(2026, 4, 1)
+    invoice_count = item_count // items_per_invoice
+    for batch_start in range(0, invoice_count, 10000):
+        batch = range(batch_start + 1, min(batch_start + 10000, invoice_count) + 1)
+        db.session.execute(Invoice.__table__.insert(), [
+            {'id': i, 'invoice_number': f"BENCH-{i}", 'date': start + timedelta(minutes=i * 525600 // invoice_count),
+             'customer_name': 'Customer', 'customer_address': 'Address', 'customer_gstin': rng.choice(gstins),
+             'payment_method': 'Cash', 'status': 'PAID', 'user_id': user_id, 'total_amount': 0.0, 'gst_amount': 0.0}
+            for i in batch
+        ])
+        items = []
+        for invoice_id in batch:
+            for _ in range(items_per_invoice):
+                rate = rng.choice(RATES)
+                subtotal = round(rng.uniform(10, 1000), 2)
+                gst = round(subtotal * rate / 100, 2)
+                items.append({
+                    'invoice_id': invoice_id, 'product_id': rng.randint(1, 100), 'product_name': 'Product',
+                    'quantity': rng.randint(1, 5), 'unit_price': subtotal, 'gst_rate': rate,
+                    'subtotal': subtotal, 'gst_amount': gst, 'total': subtotal + gst
+                })
+        db.session.execute(InvoiceItem.__table__.insert(), items)
+        db.session.commit()
+    return invoice_count * items_per_invoice
+
+
+def time_naive(Invoice, limit):
+    """Seconds per line item when looping over Invoice.items in Python"""
+    started = time.perf_counter()
+    groups = {}
+    count = 0
+    for invoice in Invoice.query.order_by(Invoice.id).limit(limit):
+        for item in invoice.items:
+            key = (invoice.date.strftime('%Y-%m'), item.gst_rate, invoice.customer_gstin or '')
+            groups[key] = groups.get(key, 0) + item.gst_amount
+            count += 1
+    return (time.perf_counter() - started) / max(count, 1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--naive-invoices', type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_gst_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('PDF_STORAGE_DIR', os.path.join(workdir, 'pdfs'))
+    from app import app, db, Invoice, InvoiceItem, Product, User
+    import gst_report
+
+    with app.app_context():
+        user_id = User.query.filter_by(username='admin').first().id
+        started = time.perf_counter()
+        items = seed_history(db, Invoice, InvoiceItem, Product, user_id, args.items)
+        print(f"Seeded {items} line items in {time.perf_counter() - started:.1f}s")
+
+        reducers = [('python', False)]
+        if gst_report.np is not None:
+            reducers.insert(0, ('numpy', True))
+        else:
+            print("NumPy is not installed; timing the pure Python reducer only")
+        for label, use_numpy in reducers:
+            started = time.perf_counter()
+            report = gst_report.gst_summary(chunk_size=args.chunk_size, use_numpy=use_numpy)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<7} {elapsed:>7.2f}s  {items / elapsed:>10.0f} items/s  {len(report)} groups")
+
+        per_item = time_naive(Invoice, args.naive_invoices)
+        print(f"{'naive':<7} {per_item * items:>7.2f}s  {1 / per_item:>10.0f} items/s  "
+              f"(Invoice.items loop, extrapolated from {args.naive_invoices} invoices)")
@@ -0,0 +1,90 @@
+"""Benchmark the bulk product import on a synthetic supplier catalog.
+
+Writes a catalog of --rows products, imports it into a throwaway SQLite
+database (all inserts), then imports it again (all updates), and compares
+with the one-commit-per-product path that add_product uses:
+
+    python benchmarks/bench_import.py --rows 50000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ['steel', 'cotton', 'charger', 'cable', 'bottle', 'basmati', 'flour', 'notebook', 'marker', 'lamp']
+
+
+def write_catalog(path, rows, import_format, seed=42):
+    rng = random.Random(seed)
+    fields = ['sku', 'name', 'price', 'gst_rate', 'quantity', 'hidden']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields) if import_format == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for i in range(rows):
+            row = {
+                'sku': f"SKU{i:07d}",
+                'name': f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}",
+                'price': round(rng.uniform(10, 5000), 2),
+                'gst_rate': rng.choice([0, 5, 12, 18, 28]),
+                'quantity': rng.randint(0, 500),
+                'hidden': 'false',
+            }
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row) + '\n')
+
+
+def time_import(path, import_format, **kwargs):
+    from import_products import import_products
+
+    with open(path, newline='') as stream:
+        return import_products(stream, import_format=import_format, **kwargs)
+
+
+def time_per_row_commits(rows):
+    """Rows per second when adding products one commit at a time, like add_product"""
+    from models import db, Product
+
+    started = time.perf_counter()
+    for i in range(rows):
+        db.session.add(Product(sku=f"ONE{i:07d}", name=f"Single product {i}", price=10.0,
+                               gst_rate=18.0, quantity=1))
+        db.session.commit()
+    return rows / (time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--single-rows', type=int, default=500, help='rows for the per-row commit baseline')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_import_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('PDF_STORAGE_DIR', os.path.join(workdir, 'pdfs'))
+    from app import app
+
+    catalog = os.path.join(workdir, f"catalog.{args.format}")
+    write_catalog(catalog, args.rows, args.format)
+
+    with app.app_context():
+        print(f"{args.rows} rows, {args.format}, batches of {args.batch_size}")
+        for label, options in [
+            ('dry run', {'dry_run': True}),
+            ('insert', {}),
+            ('update', {}),
+        ]:
+            report = time_import(catalog, args.format, batch_size=args.batch_size, **options)
+            print(f"{label:<8} {report.rows / report.elapsed:>10.0f} rows/s  ({report.summary()})")
+        print(f"{'per-row':<8} {time_per_row_commits(args.single_rows):>10.0f} rows/s  "
+              f"(one commit per product, {args.single_rows} rows)")
@@ -0,0 +1,138 @@
+"""Benchmark InvoiceGenerator.render on synthetic invoice snapshots.
+
+Compares rendering with the per-process style/template cache against
+rebuilding the static parts on every call (the old behaviour), and the QR
+modes: raster without the QR cache, raster with it, and vector. --threads
+also renders each QR mode concurrently, like the RenderQueue workers do,
+and exits non-zero if any render fails:
+
+    python benchmarks/bench_render.py --items 1 10 50 --runs 50
+    python benchmarks/bench_render.py --threads 4 --runs 100
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_invoice
+from generate_invoice import InvoiceGenerator, InvoiceSnapshot, ItemSnapshot
+
+
+def make_invoice(item_count):
+    items = [
+        ItemSnapshot(
+            product_name=f"Product {i}",
+            quantity=i % 5 + 1,
+            unit_price=100.0 + i,
+            gst_rate=18.0,
+            gst_amount=(100.0 + i) * 0.18,
+            total=(100.0 + i) * 1.18
+        )
+        for i in range(item_count)
+    ]
+    total = sum(item.total for item in items)
+    gst = sum(item.gst_amount for item in items)
+    return InvoiceSnapshot(
+        id=1,
+        invoice_number='INV2026-0001',
+        date=datetime(2026, 1, 15),
+        customer_name='Benchmark Customer',
+        customer_address='1 Benchmark Road, Test City - 600001',
+        customer_gstin='33ABCDE1234F1Z5',
+        customer_phone='9876543210',
+        payment_method='Cash',
+        status='PAID',
+        total_amount=total,
+        gst_amount=gst,
+        items=items
+    )
+
+
+def time_static_build(generator, runs):
+    """Average seconds to build the cached styles and static flowables"""
+    started = time.perf_counter()
+    for _ in range(runs):
+        generator._build_static_parts()
+    return (time.perf_counter() - started) / runs
+
+
+def time_render(generator, invoice, runs, include_qr=True, cached=True, qr_cached=True):
+    """Average seconds per render call and the size of the last PDF"""
+    pdf_data = generator.render(invoice, include_qr=include_qr)  # warm up
+    started = time.perf_counter()
+    for _ in range(runs):
+        if not cached:
+            generator._static = None
+        if not qr_cached:
+            generate_invoice._qr_png.cache_clear()
+        pdf_data = generator.render(invoice, include_qr=include_qr)
+    return (time.perf_counter() - started) / runs, len(pdf_data)
+
+
+def render_concurrently(generator, invoice, threads, runs):
+    """Render on several threads sharing one generator; returns the errors raised"""
+    errors = []
+
+    def render_loop():
+        for _ in range(runs):
+            try:
+                generator.render(invoice)
+            except Exception as e:
+                errors.append(repr(e))
+
+    pool = [threading.Thread(target=render_loop) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--no-qr', action='store_true')
+    parser.add_argument('--threads', type=int, default=0, help='also render concurrently on this many threads')
+    args = parser.parse_args()
+
+    generator = InvoiceGenerator()
+    include_qr = not args.no_qr
+    static = time_static_build(generator, args.runs)
+    print(f"Static parts build (saved per cached PDF): {static * 1000:.2f} ms")
+    print(f"{'items':>6} {'uncached ms':>12} {'cached ms':>10} {'saved ms':>9}")
+    for item_count in args.items:
+        invoice = make_invoice(item_count)
+        uncached, _ = time_render(generator, invoice, args.runs, include_qr, cached=False)
+        cached, _ = time_render(generator, invoice, args.runs, include_qr, cached=True)
+        print(f"{item_count:>6} {uncached * 1000:>12.2f} {cached * 1000:>10.2f} {(uncached - cached) * 1000:>9.2f}")
+
+    if include_qr:
+        vector_generator = InvoiceGenerator(qr_mode='vector')
+        invoice = make_invoice(args.items[0])
+        modes = [
+            ('raster, no QR cache', generator, False),
+            ('raster, QR cache', generator, True),
+            ('vector', vector_generator, True),
+        ]
+        print(f"\n{'QR mode':<20} {'ms/PDF':>8} {'PDF bytes':>10}")
+        for label, mode_generator, qr_cached in modes:
+            seconds, size = time_render(mode_generator, invoice, args.runs, qr_cached=qr_cached)
+            print(f"{label:<20} {seconds * 1000:>8.2f} {size:>10}")
+
+    if args.threads:
+        failed = False
+        print(f"\n{'concurrent renders':<20} {'renders':>8} {'failed':>7}")
+        for qr_mode in ('raster', 'vector'):
+            errors = render_concurrently(InvoiceGenerator(qr_mode=qr_mode), make_invoice(args.items[0]),
+                                         args.threads, args.runs)
+            print(f"{qr_mode:<20} {args.threads * args.runs:>8} {len(errors):>7}")
+            if errors:
+                failed = True
+                print(f"  first error: {errors[0]}")
+        if failed:
+            sys.exit(1)
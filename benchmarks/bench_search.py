@@ -0,0 +1,80 @@
+"""Benchmark product search: ILIKE table scan vs the FTS5 trigram index.
+
+Builds a throwaway SQLite catalog of synthetic products and times the old
+index-route query (ILIKE '%term%', every match loaded) against
+ProductSearch.search (ranked, one page):
+
+    python benchmarks/bench_search.py --products 100000 --runs 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = [
+    'steel', 'cotton', 'laptop', 'charger', 'cable', 'bottle', 'rice', 'basmati', 'wheat', 'flour',
+    'notebook', 'pen', 'marker', 'chair', 'table', 'lamp', 'bulb', 'switch', 'paint', 'brush',
+    'shirt', 'saree', 'towel', 'soap', 'shampoo', 'oil', 'ghee', 'sugar', 'tea', 'coffee',
+]
+TERMS = ['lap', 'basmati', 'cable 2', 'towel', 'xyz']
+
+
+def seed_products(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        {
+            'name': f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.randint(1, 999)}",
+            'price': round(rng.uniform(10, 5000), 2),
+            'gst_rate': rng.choice([0, 5, 12, 18, 28]),
+            'quantity': rng.randint(0, 500),
+            'hidden': rng.random() < 0.05,
+        }
+        for _ in range(count)
+    ]
+
+
+def time_query(run, runs):
+    """Average seconds per call and the number of rows the last call returned"""
+    rows = run()  # warm up
+    started = time.perf_counter()
+    for _ in range(runs):
+        rows = run()
+    return (time.perf_counter() - started) / runs, len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--terms', nargs='+', default=TERMS)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_search_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('PDF_STORAGE_DIR', os.path.join(workdir, 'pdfs'))
+    from app import app, db, Product, product_search
+
+    with app.app_context():
+        if not product_search.enabled:
+            sys.exit('This SQLite build has no FTS5 trigram tokenizer')
+        db.session.execute(Product.__table__.insert(), seed_products(args.products))
+        db.session.commit()
+
+        print(f"{args.products} products, {args.runs} runs per query")
+        print(f"{'term':<10} {'ILIKE ms':>9} {'rows':>6} {'index ms':>9} {'rows':>5} {'speedup':>8}")
+        for term in args.terms:
+            ilike, ilike_rows = time_query(
+                lambda: Product.query.filter(Product.name.ilike(f'%{term}%')).filter_by(hidden=False).all(),
+                args.runs
+            )
+            indexed, indexed_rows = time_query(
+                lambda: product_search.search(term, per_page=args.per_page)[0],
+                args.runs
+            )
+            print(f"{term:<10} {ilike * 1000:>9.2f} {ilike_rows:>6} {indexed * 1000:>9.2f} "
+                  f"{indexed_rows:>5} {ilike / indexed:>7.1f}x")
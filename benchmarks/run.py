@@ -0,0 +1,380 @@
+"""Benchmark suite for the billing hot paths.
+
+Seeds throwaway SQLite databases with a synthetic catalog, users and invoice
+history (sizes are configurable, the seed is fixed), times each case and
+writes the results as JSON. With --baseline, every case's median is compared
+with a stored run and changes beyond --tolerance are flagged; the baseline
+must have been run with the same sizes and seed:
+
+    python benchmarks/run.py -o results.json
+    python benchmarks/run.py --baseline baseline.json --fail-on-regression
+    python benchmarks/run.py --invoices 2000 --only render_10 checkout
+
+Cases: generate_invoice_pdf at 1, 10 and 500 line items (forced renders)
+and reusing a current stored PDF (render_cached), checkout through
+/generate_invoice, the index search, /invoices (first and a deep page),
+/invoice_history, and regenerate_all_invoices on a separate, smaller history.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = [
+    'steel', 'cotton', 'laptop', 'charger', 'cable', 'bottle', 'rice', 'basmati', 'wheat', 'flour',
+    'notebook', 'pen', 'marker', 'chair', 'table', 'lamp', 'bulb', 'switch', 'paint', 'brush',
+]
+RATES = [0.0, 5.0, 12.0, 18.0, 28.0]
+SEARCH_TERMS = ['lap', 'basmati', 'cable 1', 'xyz']
+RENDER_SIZES = (1, 10, 500)
+# Cases run in each dataset; each dataset gets its own process and database
+DATASETS = {
+    'history': ['render_1', 'render_10', 'render_500', 'render_cached', 'checkout', 'index_search',
+                'view_invoices', 'view_invoices_deep', 'invoice_history'],
+    'regenerate': ['regenerate_all'],
+}
+
+
+# Options that don't change what a case measures
+UNCOMPARED_OPTIONS = ('runs', 'verbose')
+
+
+def configure(dataset, workdir):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, f'{dataset}.db')}"
+    os.environ['PDF_STORAGE_DIR'] = os.path.join(workdir, f"{dataset}_pdfs")
+    os.environ['PDF_RENDER_WORKERS'] = '0'
+    # Keep the notification dispatcher's polling out of the timings
+    os.environ['NOTIFY_WORKER'] = '0'
+
+
+def seed(db, models, products, users, invoices_per_user, items_per_invoice, rng):
+    """Insert products, users and their invoice history; returns the benchmark user's id"""
+    Product, User, Invoice, InvoiceItem = models
+    db.session.execute(Product.__table__.insert(), [
+        {'name': f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}", 'price': round(rng.uniform(10, 5000), 2),
+         'gst_rate': rng.choice(RATES), 'quantity': 10 ** 6, 'hidden': rng.random() < 0.02}
+        for i in range(1, products + 1)
+    ])
+    for i in range(1, users):
+        user = User(username=f"bench{i}")
+        user.set_password('bench')
+        db.session.add(user)
+    db.session.commit()
+
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+    start = datetime(2025, 4, 1)
+    next_id = (db.session.query(db.func.max(Invoice.id)).scalar() or 0) + 1
+    for user_id in user_ids:
+        for batch_start in range(0, invoices_per_user, 5000):
+            count = min(5000, invoices_per_user - batch_start)
+            invoices, items = [], []
+            for offset in range(count):
+                invoice_id = next_id
+                next_id += 1
+                lines = []
+                for _ in range(items_per_invoice):
+                    quantity = rng.randint(1, 5)
+                    price = round(rng.uniform(10, 5000), 2)
+                    rate = rng.choice(RATES)
+                    subtotal = round(price * quantity, 2)
+                    gst = round(subtotal * rate / 100, 2)
+                    lines.append({
+                        'invoice_id': invoice_id, 'product_id': rng.randint(1, products),
+                        'product_name': 'Product', 'quantity': quantity, 'unit_price': price,
+                        'gst_rate': rate, 'subtotal': subtotal, 'gst_amount': gst, 'total': subtotal + gst
+                    })
+                items += lines
+                invoices.append({
+                    'id': invoice_id, 'invoice_number': f"BENCH-{invoice_id}",
+                    'date': start + timedelta(minutes=(batch_start + offset) * 525600 // invoices_per_user),
+                    'customer_name': 'Benchmark Customer', 'customer_address': '1 Benchmark Road',
+                    'customer_gstin': '', 'customer_phone': '', 'payment_method': 'Cash', 'status': 'PAID',
+                    'user_id': user_id, 'total_amount': sum(line['total'] for line in lines),
+                    'gst_amount': sum(line['gst_amount'] for line in lines)
+                })
+            db.session.execute(Invoice.__table__.insert(), invoices)
+            db.session.execute(InvoiceItem.__table__.insert(), items)
+            db.session.commit()
+    return user_ids[0]
+
+
+def add_invoice(db, models, user_id, item_count, rng):
+    """Insert one invoice with item_count line items; returns its id"""
+    Product, User, Invoice, InvoiceItem = models
+    product_ids = [product_id for (product_id,) in db.session.query(Product.id).limit(item_count)]
+    invoice = Invoice(invoice_number=f"RENDER-{item_count}", date=datetime(2026, 1, 15),
+                      customer_name='Benchmark Customer', customer_address='1 Benchmark Road, Test City',
+                      customer_gstin='33ABCDE1234F1Z5', customer_phone='9876543210', payment_method='Cash',
+                      status='PAID', user_id=user_id, total_amount=0, gst_amount=0)
+    db.session.add(invoice)
+    db.session.flush()
+    total = gst = 0
+    for i in range(item_count):
+        price = round(rng.uniform(10, 5000), 2)
+        item = InvoiceItem(invoice_id=invoice.id, product_id=product_ids[i % len(product_ids)],
+                           product_name=f"Product {i}", quantity=1, unit_price=price, gst_rate=18.0,
+                           subtotal=price, gst_amount=round(price * 0.18, 2), total=round(price * 1.18, 2))
+        db.session.add(item)
+        total += item.total
+        gst += item.gst_amount
+    invoice.total_amount = total
+    invoice.gst_amount = gst
+    db.session.commit()
+    return invoice.id
+
+
+def summarize(timings):
+    """Timing statistics of a list of milliseconds"""
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'min_ms': round(timings[0], 3),
+    }
+
+
+def measure(run, runs, warmup=1):
+    """Call run() warmup + runs times; returns timing statistics in milliseconds"""
+    for _ in range(warmup):
+        run()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+def _expect(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+    return response
+
+
+def run_history(cases, options, log):
+    from app import app, db, render_queue, Product, User, Invoice, InvoiceItem
+    from generate_invoice import invoice_generator
+    from pagination import encode_cursor
+    from sales_aggregates import rebuild_aggregates
+
+    rng = random.Random(options['seed'])
+    models = (Product, User, Invoice, InvoiceItem)
+    runs = options['runs']
+    results = {}
+    with app.app_context():
+        started = time.perf_counter()
+        user_id = seed(db, models, options['products'], options['users'], options['invoices'],
+                       options['items_per_invoice'], rng)
+        rebuild_aggregates()
+        render_ids = {size: add_invoice(db, models, user_id, size, rng) for size in RENDER_SIZES}
+        middle = Invoice.query.filter_by(user_id=user_id).order_by(Invoice.date.desc(), Invoice.id.desc()) \
+            .offset(options['invoices'] // 2).first()
+        deep_cursor = encode_cursor(middle)
+        log(f"history: seeded {options['users']} users x {options['invoices']} invoices "
+            f"and {options['products']} products in {time.perf_counter() - started:.1f}s")
+
+        for size in RENDER_SIZES:
+            case = f"render_{size}"
+            if case in cases:
+                results[case] = measure(lambda: invoice_generator.generate_invoice_pdf(render_ids[size], force=True),
+                                        max(1, runs // 4) if size >= 500 else runs)
+        if 'render_cached' in cases:
+            # The warmup call stores the PDF; the timed calls reuse it
+            results['render_cached'] = measure(lambda: invoice_generator.generate_invoice_pdf(render_ids[10]), runs)
+
+    client = app.test_client()
+    _expect(client.post('/login', data={'username': 'admin', 'password': 'admin'}), 302)
+    pages = {
+        'index_search': lambda: [_expect(client.get('/', query_string={'search': term})) for term in SEARCH_TERMS],
+        'view_invoices': lambda: _expect(client.get('/invoices')),
+        'view_invoices_deep': lambda: _expect(client.get('/invoices', query_string={'cursor': deep_cursor})),
+        'invoice_history': lambda: _expect(client.get('/invoice_history')),
+    }
+
+    if 'checkout' in cases:
+        product_ids = list(range(1, options['products'] + 1))
+
+        def checkout():
+            for product_id in rng.sample(product_ids, 3):
+                client.post('/add_to_invoice', data={'product_id': product_id})
+            started = time.perf_counter()
+            response = client.post('/generate_invoice', data={
+                'customer_name': 'Benchmark Customer', 'customer_address': '1 Benchmark Road',
+                'payment_method': 'Cash'
+            })
+            elapsed = time.perf_counter() - started
+            if 'download_invoice' not in response.headers.get('Location', ''):
+                raise RuntimeError('checkout failed')
+            return elapsed
+
+        # Time the checkout request only: cart building is excluded and the
+        # PDF render (timed by render_*) is not queued
+        submit = render_queue.submit
+        render_queue.submit = lambda invoice_id, render: None
+        try:
+            checkout()
+            results['checkout'] = summarize([checkout() * 1000 for _ in range(runs)])
+        finally:
+            render_queue.submit = submit
+
+    for case, run in pages.items():
+        if case in cases:
+            results[case] = measure(run, runs)
+    return results
+
+
+def run_regenerate(cases, options, log):
+    from app import app, db, Product, User, Invoice, InvoiceItem
+    from generate_invoice import invoice_generator
+
+    rng = random.Random(options['seed'])
+    with app.app_context():
+        seed(db, (Product, User, Invoice, InvoiceItem), 200, 1, options['regenerate_invoices'],
+             options['items_per_invoice'], rng)
+        log(f"regenerate: seeded {options['regenerate_invoices']} invoices")
+        started = time.perf_counter()
+        stats = invoice_generator.regenerate_all_invoices()
+        elapsed = (time.perf_counter() - started) * 1000
+    return {'regenerate_all': dict(
+        summarize([elapsed]), invoices=stats['success'],
+        per_invoice_ms=round(elapsed / max(stats['success'], 1), 3)
+    )}
+
+
+def _run_dataset(dataset, cases, options, workdir, queue):
+    configure(dataset, workdir)
+    log = print if options['verbose'] else (lambda message: None)
+    # Keep the app's own prints (login, per-invoice regeneration) out of the report
+    sys.stdout = open(os.devnull, 'w') if not options['verbose'] else sys.stdout
+    try:
+        runner = run_history if dataset == 'history' else run_regenerate
+        queue.put((dataset, runner(cases, options, log), None))
+    except Exception as e:
+        queue.put((dataset, {}, f"{type(e).__name__}: {e}"))
+
+
+def run_suite(options, only=None):
+    """Run the selected cases, one process per dataset; returns the results document"""
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    ctx = multiprocessing.get_context('spawn')
+    results, errors = {}, {}
+    for dataset, cases in DATASETS.items():
+        cases = [case for case in cases if not only or case in only]
+        if not cases:
+            continue
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run_dataset, args=(dataset, cases, options, workdir, queue))
+        process.start()
+        name, dataset_results, error = queue.get()
+        process.join()
+        results.update(dataset_results)
+        if error:
+            errors[name] = error
+    return {'meta': environment(options), 'results': results, 'errors': errors}
+
+
+def environment(options):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'options': options,
+    }
+
+
+def option_differences(options, baseline):
+    """Return (option, baseline value, current value) for the options that make runs incomparable"""
+    previous = baseline.get('meta', {}).get('options', {})
+    return [(key, previous.get(key), value) for key, value in options.items()
+            if key not in UNCOMPARED_OPTIONS and previous.get(key) != value]
+
+
+def compare(results, baseline, tolerance):
+    """Return (case, baseline ms, current ms, ratio, verdict) rows for cases in both runs"""
+    rows = []
+    for case, current in results.items():
+        previous = baseline.get('results', {}).get(case)
+        if not previous or not previous.get('median_ms'):
+            continue
+        ratio = current['median_ms'] / previous['median_ms']
+        verdict = 'slower' if ratio > 1 + tolerance else 'faster' if ratio < 1 - tolerance else 'same'
+        rows.append((case, previous['median_ms'], current['median_ms'], ratio, verdict))
+    return rows
+
+
+if __name__ == '__main__':
+    all_cases = [case for cases in DATASETS.values() for case in cases]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=2, help='users, each with --invoices invoices')
+    parser.add_argument('--invoices', type=int, default=10000, help='invoices per user')
+    parser.add_argument('--items-per-invoice', type=int, default=3)
+    parser.add_argument('--regenerate-invoices', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=20, help='timed runs per case')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='+', choices=all_cases, metavar='CASE', help=' '.join(all_cases))
+    parser.add_argument('-o', '--output', help='write the results JSON here')
+    parser.add_argument('--baseline', help='results JSON to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative change reported as a difference')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit 1 if a case got slower')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    options = {key: value for key, value in vars(args).items()
+               if key not in ('only', 'output', 'baseline', 'tolerance', 'fail_on_regression')}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        differences = option_differences(options, baseline)
+        if differences:
+            sys.exit(f"{args.baseline} was run with different options, its timings are not comparable: "
+                     + ', '.join(f"--{key.replace('_', '-')} {before} (now {after})"
+                                 for key, before, after in differences))
+    document = run_suite(options, only=args.only)
+
+    print(f"{'case':<20} {'median ms':>10} {'p95 ms':>10} {'min ms':>10} {'runs':>5}")
+    for case, stats in document['results'].items():
+        print(f"{case:<20} {stats['median_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['min_ms']:>10.2f} "
+              f"{stats['runs']:>5}")
+    for dataset, error in document['errors'].items():
+        print(f"{dataset} failed: {error}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+            f.write('\n')
+
+    regressions = []
+    if baseline is not None:
+        print(f"\nCompared with {args.baseline} (commit {baseline['meta'].get('commit')}, "
+              f"tolerance {args.tolerance:.0%})")
+        for case, before, after, ratio, verdict in compare(document['results'], baseline, args.tolerance):
+            print(f"{case:<20} {before:>10.2f} -> {after:>10.2f} ms  {ratio:>6.2f}x  {verdict}")
+            if verdict == 'slower':
+                regressions.append(case)
+
+    if document['errors'] or (args.fail_on_regression and regressions):
+        sys.exit(1)
@@ -0,0 +1,144 @@
+"""Server-side cart stores.
+
+Abandoned database carts are not removed on their own; delete those left
+untouched for a week (e.g. from a daily cron job) with:
+
+    python cart_store.py --purge-days 7
+"""
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+from models import db, CartLine
+
+LINE_FIELDS = ('name', 'price', 'gst_rate', 'qty', 'subtotal', 'gst_amount', 'total')
+
+
+class CartStore:
+    """Server-side carts keyed by the cart id kept in the session.
+
+    A cart is a dict of line dicts indexed by product id, so lookups and
+    updates don't scan the cart and the session cookie stays small no
+    matter how many lines a cart has. Line dicts use the same keys as the
+    old cookie cart: id, name, price, gst_rate, qty, subtotal, gst_amount, total.
+    """
+
+    def get(self, cart_id):
+        raise NotImplementedError
+
+    def get_line(self, cart_id, product_id):
+        raise NotImplementedError
+
+    def set_line(self, cart_id, line):
+        raise NotImplementedError
+
+    def remove_line(self, cart_id, product_id):
+        raise NotImplementedError
+
+    def clear(self, cart_id):
+        raise NotImplementedError
+
+
+class MemoryCartStore(CartStore):
+    """In-process store; carts are lost on restart and not shared between workers"""
+
+    def __init__(self):
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def get(self, cart_id):
+        with self._lock:
+            return {product_id: dict(line) for product_id, line in self._carts.get(cart_id, {}).items()}
+
+    def get_line(self, cart_id, product_id):
+        with self._lock:
+            line = self._carts.get(cart_id, {}).get(product_id)
+            return dict(line) if line else None
+
+    def set_line(self, cart_id, line):
+        with self._lock:
+            self._carts.setdefault(cart_id, {})[line['id']] = dict(line)
+
+    def remove_line(self, cart_id, product_id):
+        with self._lock:
+            self._carts.get(cart_id, {}).pop(product_id, None)
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+
+class DatabaseCartStore(CartStore):
+    """Stores cart lines in the cart_line table, shared by all workers"""
+
+    @staticmethod
+    def _to_dict(cart_line):
+        line = {'id': cart_line.product_id}
+        for field in LINE_FIELDS:
+            line[field] = getattr(cart_line, field)
+        return line
+
+    def get(self, cart_id):
+        lines = CartLine.query.filter_by(cart_id=cart_id).order_by(CartLine.created_at)
+        return {cart_line.product_id: self._to_dict(cart_line) for cart_line in lines}
+
+    def get_line(self, cart_id, product_id):
+        cart_line = CartLine.query.get((cart_id, product_id))
+        return self._to_dict(cart_line) if cart_line else None
+
+    def set_line(self, cart_id, line):
+        cart_line = CartLine.query.get((cart_id, line['id']))
+        if not cart_line:
+            cart_line = CartLine(cart_id=cart_id, product_id=line['id'])
+            db.session.add(cart_line)
+        for field in LINE_FIELDS:
+            setattr(cart_line, field, line[field])
+        db.session.commit()
+
+    def remove_line(self, cart_id, product_id):
+        CartLine.query.filter_by(cart_id=cart_id, product_id=product_id).delete()
+        db.session.commit()
+
+    def clear(self, cart_id):
+        CartLine.query.filter_by(cart_id=cart_id).delete()
+        db.session.commit()
+
+    def purge(self, max_age=timedelta(days=7)):
+        """Delete carts none of whose lines have been touched for max_age; returns the lines deleted"""
+        cutoff = datetime.utcnow() - max_age
+        # Both sides range-scan ix_cart_line_updated_at; carts with a recent
+        # line are kept whole
+        active = db.session.query(CartLine.cart_id).filter(CartLine.updated_at >= cutoff)
+        deleted = CartLine.query.filter(CartLine.updated_at < cutoff, CartLine.cart_id.notin_(active)) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+
+CART_BACKENDS = {
+    'database': DatabaseCartStore,
+    'memory': MemoryCartStore,
+}
+
+
+def init_cart_store(app):
+    """Create the configured cart store for the app"""
+    backend = app.config.get('CART_BACKEND', 'database')
+    if backend not in CART_BACKENDS:
+        raise ValueError(f"Unknown cart backend: {backend}")
+    store = CART_BACKENDS[backend]()
+    app.extensions['cart_store'] = store
+    return store
+
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--purge-days', type=float, default=7,
+                        help='delete database carts untouched for this many days')
+    args = parser.parse_args()
+
+    with app.app_context():
+        deleted = DatabaseCartStore().purge(timedelta(days=args.purge_days))
+    print(f"Deleted {deleted} cart lines untouched for {args.purge_days:g} days")
@@ -0,0 +1,120 @@
+"""Check that the invoice views stay within their SQL statement budgets.
+
+Counts the statements each endpoint issues against the configured database
+and fails if any endpoint goes over its budget, so N+1 regressions show up
+before they reach production. Needs a user with at least one invoice:
+
+    python check_query_budgets.py --username admin
+"""
+import argparse
+import os
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# The notification dispatcher's polling would show up in the counts
+os.environ.setdefault('NOTIFY_WORKER', '0')
+from app import app, db, Invoice, User, api_invoice, api_invoices
+
+# Maximum statements per request, including the Flask-Login user lookup
+QUERY_BUDGETS = {
+    'index': 5,
+    'view_invoices': 2,
+    'view_invoice': 3,
+    'invoice_history': 3,
+    'api_invoices': 1,
+    'api_invoice': 2,
+}
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Collect the SQL statements executed on the engine inside the block"""
+    engine = engine or db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def measure_endpoints(user, invoice):
+    """Return {endpoint: statements} for the budgeted invoice endpoints"""
+    results = {}
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+        sess['_fresh'] = True
+
+    pages = {
+        'index': '/',
+        'view_invoices': '/invoices',
+        'view_invoice': f'/invoice/{invoice.id}',
+        'invoice_history': '/invoice_history',
+    }
+    for endpoint, url in pages.items():
+        db.session.remove()
+        with count_queries() as statements:
+            response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        results[endpoint] = statements
+
+    # The API views are called directly, bypassing token authentication
+    user_id = user.id
+    invoice_id = invoice.id
+    db.session.remove()
+    api_user = User.query.get(user_id)
+    with app.test_request_context():
+        with count_queries() as statements:
+            api_invoices.__wrapped__(api_user)
+        results['api_invoices'] = statements
+
+        with count_queries() as statements:
+            api_invoice.__wrapped__(api_user, invoice_id)
+        results['api_invoice'] = statements
+
+    return results
+
+
+def check_query_budgets(user, invoice, verbose=False):
+    """Return a list of (endpoint, count, budget) for endpoints over budget"""
+    failures = []
+    for endpoint, statements in measure_endpoints(user, invoice).items():
+        budget = QUERY_BUDGETS[endpoint]
+        status = 'OK' if len(statements) <= budget else 'OVER BUDGET'
+        print(f"{endpoint}: {len(statements)} queries (budget {budget}) {status}")
+        if verbose:
+            for statement in statements:
+                print(f"    {' '.join(statement.split())}")
+        if len(statements) > budget:
+            failures.append((endpoint, len(statements), budget))
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--verbose', action='store_true', help='print every statement')
+    args = parser.parse_args()
+
+    with app.app_context():
+        user = User.query.filter_by(username=args.username).first()
+        if not user:
+            sys.exit(f"User {args.username} not found")
+
+        # Use the user's invoice with the most items to expose per-item queries
+        invoice = Invoice.query.filter_by(user_id=user.id).join(Invoice.items).group_by(
+            Invoice.id
+        ).order_by(db.func.count().desc()).first()
+        if not invoice:
+            sys.exit(f"User {args.username} has no invoices with items")
+
+        if check_query_budgets(user, invoice, verbose=args.verbose):
+            sys.exit(1)
@@ -0,0 +1,110 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from models import db
+
+# Connection settings per DB_PROFILE. 'production', set by the Procfile and
+# render.yaml, keeps a pool of connections and tunes SQLite: WAL lets
+# readers run alongside the single writer, synchronous=NORMAL is durable in
+# WAL mode short of a power loss, the memory map and page cache keep hot
+# pages out of read() calls, and the busy timeout makes concurrent checkouts
+# wait for the write lock instead of failing with "database is locked".
+# 'default' (the default, for dev checkouts and scripts) keeps the driver
+# defaults.
+PROFILES = {
+    'default': {},
+    'production': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        # Server databases only: drop connections closed by the server
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'sqlite_pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64000,  # KiB, i.e. 64 MB
+            'busy_timeout': 5000,  # ms
+        },
+    },
+}
+# app.config keys that override a profile setting when set
+CONFIG_KEYS = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+    'DB_POOL_RECYCLE': 'pool_recycle',
+}
+PRAGMA_CONFIG_KEYS = {
+    'SQLITE_JOURNAL_MODE': 'journal_mode',
+    'SQLITE_SYNCHRONOUS': 'synchronous',
+    'SQLITE_MMAP_SIZE': 'mmap_size',
+    'SQLITE_CACHE_SIZE': 'cache_size',
+    'SQLITE_BUSY_TIMEOUT': 'busy_timeout',
+}
+
+
+class DatabaseProfile:
+    """Engine options and per-connection SQLite PRAGMAs of a named profile"""
+
+    def __init__(self, name, settings, database_url):
+        url = make_url(database_url)
+        is_sqlite = url.get_backend_name() == 'sqlite'
+        settings = dict(settings)
+        pragmas = settings.pop('sqlite_pragmas', {})
+        self.name = name
+        self.pragmas = pragmas if is_sqlite else {}
+        self.engine_options = settings
+        if is_sqlite:
+            settings.pop('pool_recycle', None)
+            settings.pop('pool_pre_ping', None)
+            if url.database in (None, '', ':memory:'):
+                # Flask-SQLAlchemy shares one connection (StaticPool) for in-memory databases
+                for option in ('pool_size', 'max_overflow', 'pool_timeout'):
+                    settings.pop(option, None)
+            elif 'pool_size' in settings:
+                # SQLAlchemy 1.4 opens a new connection per checkout for SQLite
+                # files (NullPool); a queue pool reuses connections, which keeps
+                # the PRAGMAs, page cache and memory map across requests
+                settings['poolclass'] = QueuePool
+                settings['connect_args'] = {'check_same_thread': False}
+
+    def apply_pragmas(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in self.pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+    def describe(self):
+        settings = [f"{key}={getattr(value, '__name__', value)}" for key, value in self.engine_options.items()
+                    if key != 'connect_args']
+        settings += [f"{pragma}={value}" for pragma, value in self.pragmas.items()]
+        return f"{self.name} ({', '.join(settings) or 'driver defaults'})"
+
+
+def init_db_profile(app):
+    """Apply the DB_PROFILE connection settings; call after init_db, before the first query"""
+    name = app.config.get('DB_PROFILE', 'default')
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE: {name}")
+    settings = dict(PROFILES[name])
+    for key, option in CONFIG_KEYS.items():
+        if app.config.get(key) is not None:
+            settings[option] = int(app.config[key])
+    if 'sqlite_pragmas' in settings:
+        pragmas = dict(settings['sqlite_pragmas'])
+        for key, pragma in PRAGMA_CONFIG_KEYS.items():
+            if app.config.get(key) is not None:
+                pragmas[pragma] = app.config[key]
+        settings['sqlite_pragmas'] = pragmas
+
+    profile = DatabaseProfile(name, settings, app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}, **profile.engine_options
+    )
+    if profile.pragmas:
+        event.listen(db.get_engine(app), 'connect', profile.apply_pragmas)
+    app.extensions['db_profile'] = profile
+    return profile
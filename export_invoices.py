@@ -0,0 +1,142 @@
+"""Export invoices with their line items as CSV or JSON Lines.
+
+Rows are streamed from a server-side cursor as plain tuples (no ORM
+objects, nothing kept in the identity map), so memory use stays flat
+however many invoices are exported. CSV has one row per line item, JSON
+Lines one object per invoice with its items nested:
+
+    python export_invoices.py --format csv --start 2026-04-01 --end 2027-03-31 -o fy2026.csv
+    python export_invoices.py --format jsonl --username admin -o invoices.jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from models import db, Invoice, InvoiceItem, User
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+INVOICE_COLUMNS = (
+    Invoice.id, Invoice.invoice_number, Invoice.date, Invoice.customer_name, Invoice.customer_address,
+    Invoice.customer_gstin, Invoice.customer_phone, Invoice.payment_method, Invoice.status,
+    Invoice.total_amount, Invoice.gst_amount
+)
+ITEM_COLUMNS = (
+    InvoiceItem.product_id, InvoiceItem.product_name, InvoiceItem.quantity, InvoiceItem.unit_price,
+    InvoiceItem.gst_rate, InvoiceItem.subtotal, InvoiceItem.gst_amount, InvoiceItem.total
+)
+INVOICE_FIELDS = [column.key for column in INVOICE_COLUMNS]
+ITEM_FIELDS = [column.key for column in ITEM_COLUMNS]
+CSV_HEADER = [
+    'invoice_id', 'invoice_number', 'date', 'customer_name', 'customer_address', 'customer_gstin',
+    'customer_phone', 'payment_method', 'status', 'total_amount', 'invoice_gst_amount',
+    'product_id', 'product_name', 'quantity', 'unit_price', 'gst_rate', 'subtotal', 'item_gst_amount',
+    'item_total'
+]
+
+# Rows fetched from the cursor per round trip
+YIELD_PER = 1000
+# Rows written per chunk of a streamed response
+CHUNK_ROWS = 500
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD date argument; None for empty values"""
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+
+def iter_invoice_rows(user_id=None, start=None, end=None):
+    """Yield (invoice columns..., item columns...) tuples ordered by invoice.
+
+    start and end are inclusive dates. Invoices without items yield a single
+    row with the item columns set to None.
+    """
+    query = db.session.query(*INVOICE_COLUMNS, *ITEM_COLUMNS).outerjoin(
+        InvoiceItem, InvoiceItem.invoice_id == Invoice.id
+    )
+    if user_id is not None:
+        query = query.filter(Invoice.user_id == user_id)
+    if start:
+        query = query.filter(Invoice.date >= start)
+    if end:
+        query = query.filter(Invoice.date < end + timedelta(days=1))
+    return query.order_by(Invoice.id, InvoiceItem.id).yield_per(YIELD_PER)
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(rows):
+    """Yield CSV text in chunks of CHUNK_ROWS rows, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(_json_value(value) for value in row)
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows):
+    """Yield one JSON document per invoice with its items nested, in chunks"""
+    invoice_width = len(INVOICE_FIELDS)
+    lines = []
+    for _, invoice_rows in groupby(rows, key=lambda row: row[0]):
+        invoice_rows = list(invoice_rows)
+        invoice = dict(zip(INVOICE_FIELDS, map(_json_value, invoice_rows[0][:invoice_width])))
+        invoice['items'] = [
+            dict(zip(ITEM_FIELDS, row[invoice_width:]))
+            for row in invoice_rows if row[invoice_width] is not None
+        ]
+        lines.append(json.dumps(invoice, default=float))  # money amounts are Decimals
+        if len(lines) == CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_invoices(export_format, user_id=None, start=None, end=None):
+    """Return a generator of text chunks for the export"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    rows = iter_invoice_rows(user_id=user_id, start=start, end=end)
+    return iter_csv(rows) if export_format == 'csv' else iter_jsonl(rows)
+
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--start', type=parse_date, help='first invoice date (YYYY-MM-DD)')
+    parser.add_argument('--end', type=parse_date, help='last invoice date (YYYY-MM-DD)')
+    parser.add_argument('--username', help='only export this user\'s invoices')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_id = None
+        if args.username:
+            user = User.query.filter_by(username=args.username).first()
+            if not user:
+                sys.exit(f"User {args.username} not found")
+            user_id = user.id
+
+        output = open(args.output, 'w', newline='') if args.output else sys.stdout
+        try:
+            for chunk in export_invoices(args.format, user_id=user_id, start=args.start, end=args.end):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
@@ -1,17 +1,184 @@
+import copy
+import hashlib
+import json
+import time
 from datetime import datetime
-from models import db, Invoice, InvoicePDF, Product
+from functools import lru_cache
+from models import db, Invoice, InvoiceItem, InvoicePDF, Product, INVOICE_WITH_ITEMS
+from pdf_storage import get_pdf_storage
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.graphics.shapes import Drawing, Path
 from io import BytesIO
 import qrcode
 from PIL import Image as PILImage
 
+QR_SIZE = 1.5*inch
+QR_CACHE_SIZE = 1024
+# Invoices loaded, rendered and written per commit by regenerate_all_invoices
+REGENERATE_CHUNK_SIZE = 500
+# Part of every PDF fingerprint; bump it when the layout changes so stored
+# PDFs are rendered again
+RENDER_VERSION = 1
+
+INVOICE_FIELDS = (
+    'id', 'invoice_number', 'date', 'customer_name', 'customer_address', 'customer_gstin',
+    'customer_phone', 'payment_method', 'status', 'total_amount', 'gst_amount'
+)
+ITEM_FIELDS = ('product_name', 'quantity', 'unit_price', 'gst_rate', 'gst_amount', 'total')
+
+# Callables invoked as observer(invoice, seconds, pdf_size) after every render
+render_observers = []
+
+
+class ItemSnapshot:
+    """The line item fields printed on an invoice"""
+    __slots__ = ITEM_FIELDS
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields[name])
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(**{name: getattr(item, name) for name in cls.__slots__})
+
+
+class InvoiceSnapshot:
+    """Plain, picklable copy of the invoice data the renderer needs.
+
+    Rendering a snapshot never touches the database or the app context, so
+    snapshots can be rendered in worker processes or in a profiler.
+    """
+    __slots__ = INVOICE_FIELDS + ('items',)
+
+    def __init__(self, items=(), **fields):
+        for name in INVOICE_FIELDS:
+            setattr(self, name, fields[name])
+        self.items = list(items)
+
+    @classmethod
+    def from_invoice(cls, invoice):
+        """Snapshot an Invoice; load it with INVOICE_WITH_ITEMS to avoid a lazy load"""
+        return cls(
+            items=[ItemSnapshot.from_item(item) for item in invoice.items],
+            **{name: getattr(invoice, name) for name in INVOICE_FIELDS}
+        )
+
+
+def load_snapshot(invoice_id):
+    """Snapshot one invoice and its items (two queries); 404 if it doesn't exist"""
+    return InvoiceSnapshot.from_invoice(Invoice.query.options(INVOICE_WITH_ITEMS).get_or_404(invoice_id))
+
+
+def save_pdf_records(records):
+    """Create or update InvoicePDF rows from (invoice_id, invoice_number, content_hash, file_size, fingerprint).
+
+    One SELECT finds the existing rows; the caller commits. created_at only
+    moves when the fingerprint does, i.e. when the printed content changed.
+    """
+    if not records:
+        return
+    existing = {
+        pdf.invoice_id: pdf
+        for pdf in InvoicePDF.query.filter(InvoicePDF.invoice_id.in_([record[0] for record in records]))
+    }
+    now = datetime.utcnow()
+    for invoice_id, invoice_number, content_hash, file_size, fingerprint in records:
+        invoice_pdf = existing.get(invoice_id)
+        if not invoice_pdf:
+            db.session.add(InvoicePDF(
+                invoice_id=invoice_id,
+                content_hash=content_hash,
+                fingerprint=fingerprint,
+                file_name=f"invoice_{invoice_number}.pdf",
+                file_size=file_size,
+                created_at=now
+            ))
+        else:
+            if invoice_pdf.fingerprint != fingerprint:
+                invoice_pdf.created_at = now
+            invoice_pdf.content_hash = content_hash
+            invoice_pdf.fingerprint = fingerprint
+            invoice_pdf.file_size = file_size
+
+
+def stored_pdfs(invoice_ids):
+    """{invoice_id: InvoicePDF} for the invoices' stored PDFs, in one query"""
+    return {pdf.invoice_id: pdf for pdf in InvoicePDF.query.filter(InvoicePDF.invoice_id.in_(invoice_ids))}
+
+
+def is_current(invoice_pdf, fingerprint, storage):
+    """Whether a stored PDF was rendered from the same content and options and is still in storage"""
+    return (invoice_pdf is not None and invoice_pdf.fingerprint == fingerprint
+            and storage.exists(invoice_pdf.content_hash))
+
+
+def _encode_qr(qr_data):
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    return qr
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _qr_png(qr_data):
+    """PNG bytes of the QR code for a payload, memoized across renders"""
+    qr_img = _encode_qr(qr_data).make_image(fill_color="black", back_color="white")
+    img_buffer = BytesIO()
+    qr_img.save(img_buffer, format='PNG')
+    return img_buffer.getvalue()
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _qr_path(qr_data):
+    """QR code as one filled ReportLab path, memoized across renders.
+
+    Runs of dark modules on a row become rectangles of the path.
+    """
+    matrix = _encode_qr(qr_data).get_matrix()
+    module = QR_SIZE / len(matrix)
+    path = Path(fillColor=colors.black, strokeColor=None)
+    for row, cells in enumerate(matrix):
+        top = QR_SIZE - row * module
+        bottom = top - module
+        col = 0
+        while col < len(cells):
+            if not cells[col]:
+                col += 1
+                continue
+            start = col
+            while col < len(cells) and cells[col]:
+                col += 1
+            path.moveTo(start * module, bottom)
+            path.lineTo(col * module, bottom)
+            path.lineTo(col * module, top)
+            path.lineTo(start * module, top)
+            path.closePath()
+    return path
+
+
+def _qr_drawing(qr_data):
+    """QR code as ReportLab vector shapes, skipping the PIL/PNG round trip.
+
+    ReportLab sets and deletes canv/_parent on the drawing and its shapes while
+    drawing them, so every render gets a new Drawing around a shallow copy of
+    the cached path; the point list itself is only read and stays shared.
+    """
+    drawing = Drawing(QR_SIZE, QR_SIZE)
+    drawing.add(copy.copy(_qr_path(qr_data)))
+    return drawing
+
+
 class InvoiceGenerator:
-    def __init__(self):
+    def __init__(self, qr_mode='raster'):
+        if qr_mode not in ('raster', 'vector'):
+            raise ValueError(f"Unknown QR mode: {qr_mode}")
+        self.qr_mode = qr_mode
         self.company_info = {
             'company_name': 'Your Company Name',
             'company_address': '123 Business Street, City, State - 123456',
@@ -20,119 +187,50 @@ class InvoiceGenerator:
             'company_email': 'contact@yourcompany.com',
             'company_website': 'www.yourcompany.com'
         }
-        
-    def _create_qr_code(self, invoice):
-        """Generate QR code with invoice details"""
-        qr_data = (
-            f"Invoice: {invoice.invoice_number}\n"
-            f"Date: {invoice.date.strftime('%d-%m-%Y')}\n"
-            f"Amount: ₹{invoice.total_amount:.2f}\n"
-            f"GSTIN: {invoice.customer_gstin}"
-        )
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to bytes
-        img_buffer = BytesIO()
-        qr_img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        return Image(img_buffer, width=1.5*inch, height=1.5*inch)
-
-    def generate_invoice_pdf(self, invoice_id, include_qr=True):
-        """Generate PDF for a given invoice ID"""
-        try:
-            # Get invoice from database
-            invoice = Invoice.query.get_or_404(invoice_id)
-            
-            # Create PDF buffer
-            buffer = BytesIO()
-            
-            # Create the PDF document
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=letter,
-                rightMargin=72,
-                leftMargin=72,
-                topMargin=72,
-                bottomMargin=72
-            )
-
-            # Container for the 'Flowable' objects
-            elements = []
-            
-            # Styles
-            styles = getSampleStyleSheet()
-            styles.add(ParagraphStyle(
-                name='Center',
-                parent=styles['Heading1'],
-                alignment=TA_CENTER,
-            ))
-            styles.add(ParagraphStyle(
-                name='Right',
-                parent=styles['Normal'],
-                alignment=TA_RIGHT,
-            ))
+        # Styles, table styles and static flowables, built once on first render
+        self._static = None
+
+    def _build_static_parts(self):
+        """Build the parts of the PDF that are identical for every invoice"""
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(
+            name='Center',
+            parent=styles['Heading1'],
+            alignment=TA_CENTER,
+        ))
+        styles.add(ParagraphStyle(
+            name='Right',
+            parent=styles['Normal'],
+            alignment=TA_RIGHT,
+        ))
 
-            # Add company header
-            elements.append(Paragraph(self.company_info['company_name'], styles['Center']))
-            elements.append(Spacer(1, 12))
-            elements.append(Paragraph(self.company_info['company_address'], styles['Center']))
-            elements.append(Paragraph(f"GSTIN: {self.company_info['company_gstin']}", styles['Center']))
-            elements.append(Paragraph(f"Phone: {self.company_info['company_phone']}", styles['Center']))
-            elements.append(Paragraph(f"Email: {self.company_info['company_email']}", styles['Center']))
-            elements.append(Spacer(1, 20))
-
-            # Add invoice details and QR code in a table
-            invoice_data = [[
-                Paragraph(f"Invoice #{invoice.invoice_number}<br/>Date: {invoice.date.strftime('%d-%m-%Y')}", styles['Normal']),
-                self._create_qr_code(invoice) if include_qr else Paragraph("", styles['Normal'])
-            ]]
-            invoice_table = Table(invoice_data, colWidths=[4*inch, 2*inch])
-            invoice_table.setStyle(TableStyle([
+        header = [
+            Paragraph(self.company_info['company_name'], styles['Center']),
+            Spacer(1, 12),
+            Paragraph(self.company_info['company_address'], styles['Center']),
+            Paragraph(f"GSTIN: {self.company_info['company_gstin']}", styles['Center']),
+            Paragraph(f"Phone: {self.company_info['company_phone']}", styles['Center']),
+            Paragraph(f"Email: {self.company_info['company_email']}", styles['Center']),
+            Spacer(1, 20),
+        ]
+        footer = [
+            Paragraph("Thank you for your business!", styles['Center']),
+            Spacer(1, 12),
+            Paragraph("This is a computer-generated invoice.", styles['Center']),
+        ]
+
+        return {
+            'styles': styles,
+            'header': header,
+            'footer': footer,
+            'bill_to': Paragraph("Bill To:", styles['Heading3']),
+            'no_qr': Paragraph("", styles['Normal']),
+            'invoice_table_style': TableStyle([
                 ('ALIGN', (0, 0), (0, 0), 'LEFT'),
                 ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
                 ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-            elements.append(invoice_table)
-            elements.append(Spacer(1, 12))
-
-            # Add customer details
-            elements.append(Paragraph("Bill To:", styles['Heading3']))
-            elements.append(Paragraph(invoice.customer_name, styles['Normal']))
-            elements.append(Paragraph(invoice.customer_address, styles['Normal']))
-            if invoice.customer_gstin:
-                elements.append(Paragraph(f"GSTIN: {invoice.customer_gstin}", styles['Normal']))
-            if invoice.customer_phone:
-                elements.append(Paragraph(f"Phone: {invoice.customer_phone}", styles['Normal']))
-            elements.append(Spacer(1, 20))
-
-            # Add items table
-            table_data = [
-                ['Item', 'Quantity', 'Unit Price', 'GST Rate', 'GST Amount', 'Total']
-            ]
-            
-            for item in invoice.items:
-                table_data.append([
-                    item.product_name,
-                    str(item.quantity),
-                    f"₹{item.unit_price:.2f}",
-                    f"{item.gst_rate}%",
-                    f"₹{item.gst_amount:.2f}",
-                    f"₹{item.total:.2f}"
-                ])
-
-            # Add totals
-            table_data.extend([
-                ['', '', '', '', 'Subtotal:', f"₹{(invoice.total_amount - invoice.gst_amount):.2f}"],
-                ['', '', '', '', 'GST Total:', f"₹{invoice.gst_amount:.2f}"],
-                ['', '', '', '', 'Total:', f"₹{invoice.total_amount:.2f}"]
-            ])
-
-            # Create the table with improved styling
-            table = Table(table_data, colWidths=[2*inch, inch, 1.1*inch, inch, 1.2*inch, 1.2*inch])
-            table.setStyle(TableStyle([
+            ]),
+            'items_table_style': TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -145,49 +243,64 @@ class InvoiceGenerator:
                 ('FONTSIZE', (0, -3), (-1, -1), 10),
                 ('ALIGN', (-2, -3), (-1, -1), 'RIGHT'),
                 ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#bdc3c7'))
-            ]))
-            elements.append(table)
-            elements.append(Spacer(1, 20))
-
-            # Add payment information with improved styling
-            payment_data = [
-                ['Payment Method:', invoice.payment_method],
-                ['Status:', invoice.status]
-            ]
-            payment_table = Table(payment_data, colWidths=[2*inch, 4*inch])
-            payment_table.setStyle(TableStyle([
+            ]),
+            'payment_table_style': TableStyle([
                 ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
                 ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
                 ('ALIGN', (1, 0), (1, -1), 'LEFT'),
                 ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#2c3e50')),
-            ]))
-            elements.append(payment_table)
-            elements.append(Spacer(1, 20))
-
-            # Add footer
-            elements.append(Paragraph("Thank you for your business!", styles['Center']))
-            elements.append(Spacer(1, 12))
-            elements.append(Paragraph("This is a computer-generated invoice.", styles['Center']))
-
-            # Build PDF
-            doc.build(elements)
-            pdf_data = buffer.getvalue()
-            buffer.close()
-
-            # Create or update InvoicePDF record
-            invoice_pdf = InvoicePDF.query.filter_by(invoice_id=invoice.id).first()
-            if not invoice_pdf:
-                invoice_pdf = InvoicePDF(
-                    invoice_id=invoice.id,
-                    pdf_data=pdf_data,
-                    file_name=f"invoice_{invoice.invoice_number}.pdf",
-                    file_size=len(pdf_data)
-                )
-                db.session.add(invoice_pdf)
-            else:
-                invoice_pdf.pdf_data = pdf_data
-                invoice_pdf.file_size = len(pdf_data)
-                invoice_pdf.created_at = datetime.utcnow()
+            ]),
+        }
+
+    def _static_parts(self):
+        if self._static is None:
+            self._static = self._build_static_parts()
+        return self._static
+
+    @staticmethod
+    def _fresh(flowables):
+        # Flowables keep layout state while a document is built, so every
+        # render gets its own shallow copies of the already-parsed paragraphs
+        return [copy.copy(flowable) for flowable in flowables]
+
+    def _create_qr_code(self, invoice):
+        """Generate QR code with invoice details"""
+        qr_data = (
+            f"Invoice: {invoice.invoice_number}\n"
+            f"Date: {invoice.date.strftime('%d-%m-%Y')}\n"
+            f"Amount: ₹{invoice.total_amount:.2f}\n"
+            f"GSTIN: {invoice.customer_gstin}"
+        )
+        if self.qr_mode == 'vector':
+            return _qr_drawing(qr_data)
+        return Image(BytesIO(_qr_png(qr_data)), width=QR_SIZE, height=QR_SIZE)
+
+    def fingerprint(self, invoice, include_qr=True):
+        """SHA-256 of everything printed on the invoice's PDF and the render options"""
+        content = {
+            'version': RENDER_VERSION,
+            'options': {'include_qr': include_qr, 'qr_mode': self.qr_mode, 'company': self.company_info},
+            'invoice': {name: getattr(invoice, name) for name in INVOICE_FIELDS},
+            'items': [[getattr(item, name) for name in ITEM_FIELDS] for item in invoice.items],
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+    def generate_invoice_pdf(self, invoice_id, include_qr=True, force=False):
+        """Return the PDF bytes of an invoice, rendering and storing them only if needed.
+
+        The stored PDF is reused while its fingerprint matches the invoice;
+        force renders it again regardless.
+        """
+        try:
+            snapshot = load_snapshot(invoice_id)
+            fingerprint = self.fingerprint(snapshot, include_qr)
+            storage = get_pdf_storage()
+            invoice_pdf = InvoicePDF.query.filter_by(invoice_id=invoice_id).first()
+            if not force and is_current(invoice_pdf, fingerprint, storage):
+                return storage.read(invoice_pdf.content_hash)
+
+            pdf_data = self.render(snapshot, include_qr=include_qr)
+            self.save_pdf(snapshot, pdf_data, fingerprint)
 
             db.session.commit()
             return pdf_data
@@ -196,59 +309,169 @@ class InvoiceGenerator:
             db.session.rollback()
             raise Exception(f"Failed to generate invoice PDF: {str(e)}")
 
-    def regenerate_all_invoices(self):
-        """Attempt to regenerate PDFs for all invoices."""
-        from app import db
+    def render(self, invoice, include_qr=True):
+        """Render the PDF bytes of an InvoiceSnapshot without touching the database.
 
+        Any object with the INVOICE_FIELDS attributes and items with the
+        ITEM_FIELDS attributes works, including a loaded Invoice.
+        """
+        started = time.perf_counter()
+        # Create PDF buffer
+        buffer = BytesIO()
+        
+        # Create the PDF document
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=letter,
+            rightMargin=72,
+            leftMargin=72,
+            topMargin=72,
+            bottomMargin=72
+        )
+
+        static = self._static_parts()
+        styles = static['styles']
+
+        # Container for the 'Flowable' objects, starting with the company header
+        elements = self._fresh(static['header'])
+
+        # Add invoice details and QR code in a table
+        invoice_data = [[
+            Paragraph(f"Invoice #{invoice.invoice_number}<br/>Date: {invoice.date.strftime('%d-%m-%Y')}", styles['Normal']),
+            self._create_qr_code(invoice) if include_qr else copy.copy(static['no_qr'])
+        ]]
+        invoice_table = Table(invoice_data, colWidths=[4*inch, 2*inch])
+        invoice_table.setStyle(static['invoice_table_style'])
+        elements.append(invoice_table)
+        elements.append(Spacer(1, 12))
+
+        # Add customer details
+        elements.append(copy.copy(static['bill_to']))
+        elements.append(Paragraph(invoice.customer_name, styles['Normal']))
+        elements.append(Paragraph(invoice.customer_address, styles['Normal']))
+        if invoice.customer_gstin:
+            elements.append(Paragraph(f"GSTIN: {invoice.customer_gstin}", styles['Normal']))
+        if invoice.customer_phone:
+            elements.append(Paragraph(f"Phone: {invoice.customer_phone}", styles['Normal']))
+        elements.append(Spacer(1, 20))
+
+        # Add items table
+        table_data = [
+            ['Item', 'Quantity', 'Unit Price', 'GST Rate', 'GST Amount', 'Total']
+        ]
+        
+        for item in invoice.items:
+            table_data.append([
+                item.product_name,
+                str(item.quantity),
+                f"₹{item.unit_price:.2f}",
+                f"{item.gst_rate}%",
+                f"₹{item.gst_amount:.2f}",
+                f"₹{item.total:.2f}"
+            ])
+
+        # Add totals
+        table_data.extend([
+            ['', '', '', '', 'Subtotal:', f"₹{(invoice.total_amount - invoice.gst_amount):.2f}"],
+            ['', '', '', '', 'GST Total:', f"₹{invoice.gst_amount:.2f}"],
+            ['', '', '', '', 'Total:', f"₹{invoice.total_amount:.2f}"]
+        ])
+
+        # Create the table with improved styling
+        table = Table(table_data, colWidths=[2*inch, inch, 1.1*inch, inch, 1.2*inch, 1.2*inch])
+        table.setStyle(static['items_table_style'])
+        elements.append(table)
+        elements.append(Spacer(1, 20))
+
+        # Add payment information with improved styling
+        payment_data = [
+            ['Payment Method:', invoice.payment_method],
+            ['Status:', invoice.status]
+        ]
+        payment_table = Table(payment_data, colWidths=[2*inch, 4*inch])
+        payment_table.setStyle(static['payment_table_style'])
+        elements.append(payment_table)
+        elements.append(Spacer(1, 20))
+
+        # Add footer
+        elements.extend(self._fresh(static['footer']))
+
+        # Build PDF
+        doc.build(elements)
+        pdf_data = buffer.getvalue()
+        buffer.close()
+        if render_observers:
+            elapsed = time.perf_counter() - started
+            for observer in render_observers:
+                observer(invoice, elapsed, len(pdf_data))
+        return pdf_data
+
+    def save_pdf(self, invoice, pdf_data, fingerprint):
+        """Store the PDF and create or update its InvoicePDF record (caller commits)"""
+        content_hash = get_pdf_storage().save(pdf_data)
+        save_pdf_records([(invoice.id, invoice.invoice_number, content_hash, len(pdf_data), fingerprint)])
+
+    def regenerate_all_invoices(self, chunk_size=REGENERATE_CHUNK_SIZE, force=False):
+        """Attempt to regenerate PDFs for all invoices.
+
+        Invoices are snapshotted a chunk at a time, rendered, and their
+        InvoicePDF rows written with one commit per chunk. Invoices whose
+        stored PDF still matches their fingerprint are left alone unless
+        force is set.
+        """
         success_count = 0
         failure_count = 0
         skipped_count = 0
+        unchanged_count = 0
+
+        # Find invoices containing now-hidden products with one query up front
+        hidden_invoice_ids = {
+            invoice_id for (invoice_id,) in db.session.query(InvoiceItem.invoice_id)
+            .join(Product).filter(Product.hidden.is_(True)).distinct()
+        }
+        storage = get_pdf_storage()
+        last_id = 0
+        while True:
+            snapshots = [
+                InvoiceSnapshot.from_invoice(invoice)
+                for invoice in Invoice.query.options(INVOICE_WITH_ITEMS).filter(Invoice.id > last_id)
+                .order_by(Invoice.id).limit(chunk_size)
+            ]
+            if not snapshots:
+                break
+            last_id = snapshots[-1].id
+            existing = stored_pdfs([snapshot.id for snapshot in snapshots])
+            db.session.expunge_all()
 
-        invoices = Invoice.query.all()
-        for invoice in invoices:
-            try:
-                # Check if any products in this invoice are now hidden
-                has_hidden_products = False
-                for item in invoice.items:
-                    product = Product.query.get(item.product_id)
-                    if product and product.hidden:
-                        has_hidden_products = True
-                        break
-
-                if has_hidden_products:
-                    print(f"Skipping invoice {invoice.invoice_number} - contains hidden products")
+            records = []
+            for snapshot in snapshots:
+                if snapshot.id in hidden_invoice_ids:
+                    print(f"Skipping invoice {snapshot.invoice_number} - contains hidden products")
                     skipped_count += 1
                     continue
+                fingerprint = self.fingerprint(snapshot)
+                if not force and is_current(existing.get(snapshot.id), fingerprint, storage):
+                    unchanged_count += 1
+                    continue
+                try:
+                    pdf_data = self.render(snapshot)
+                    records.append((snapshot.id, snapshot.invoice_number, storage.save(pdf_data), len(pdf_data),
+                                    fingerprint))
+                    success_count += 1
+                    print(f"Successfully regenerated invoice {snapshot.invoice_number}")
+                except Exception as e:
+                    failure_count += 1
+                    print(f"Failed to regenerate invoice {snapshot.invoice_number}: {str(e)}")
 
-                pdf_data = self.generate_invoice_pdf(invoice.id)
-                if not pdf_data:
-                    raise ValueError("PDF generation failed - no data returned")
-
-                # Update or create PDF record
-                invoice_pdf = InvoicePDF.query.filter_by(invoice_id=invoice.id).first()
-                if not invoice_pdf:
-                    invoice_pdf = InvoicePDF(
-                        invoice_id=invoice.id,
-                        file_name=f"invoice_{invoice.invoice_number}.pdf"
-                    )
-
-                invoice_pdf.pdf_data = pdf_data
-                invoice_pdf.file_size = len(pdf_data)
-                db.session.add(invoice_pdf)
+            if records:
+                save_pdf_records(records)
                 db.session.commit()
 
-                success_count += 1
-                print(f"Successfully regenerated invoice {invoice.invoice_number}")
-
-            except Exception as e:
-                failure_count += 1
-                print(f"Failed to regenerate invoice {invoice.invoice_number}: {str(e)}")
-                continue
-
         return {
             'success': success_count,
             'failure': failure_count,
-            'skipped': skipped_count
+            'skipped': skipped_count,
+            'unchanged': unchanged_count
         }
 
 # Create an instance of the invoice generator
@@ -0,0 +1,166 @@
+"""GST summary by month, GST rate and customer GSTIN.
+
+Invoice line items are read in chunks from a server-side cursor as plain
+column tuples, turned into columnar arrays and reduced with vectorized
+grouped sums in NumPy (a plain Python loop remains for environments
+installed without requirements.txt, and for --no-numpy). Only one chunk and
+the running group totals are held in memory, so millions of line items
+report in seconds. Amounts are summed as integer paise, so the totals are
+exact:
+
+    python gst_report.py --start 2026-04-01 --end 2027-03-31 -o gstr_fy2026.csv
+"""
+import argparse
+import csv
+import io
+import sys
+import time
+from array import array
+from datetime import timedelta
+
+from sqlalchemy import BigInteger, extract, select, type_coerce
+
+from money import from_paise
+from models import db, Invoice, InvoiceItem, User
+
+try:
+    import numpy as np
+except ImportError:  # listed in requirements.txt; without it the report falls back to pure Python
+    np = None
+
+# Line items per chunk; bounds memory at a few MB of column arrays
+CHUNK_SIZE = 100000
+GROUP_FIELDS = ('month', 'gst_rate', 'customer_gstin')
+SUM_FIELDS = ('line_count', 'quantity', 'taxable_value', 'gst_amount', 'total')
+
+
+def iter_item_chunks(user_id=None, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Yield line items as columns: (months, rates, gstins, quantities, subtotals, gst, totals).
+
+    months are YYYYMM integers computed in SQL and amounts are integer paise;
+    start and end are inclusive dates.
+    """
+    month = extract('year', Invoice.date) * 100 + extract('month', Invoice.date)
+    stmt = select(
+        month, InvoiceItem.gst_rate, Invoice.customer_gstin, InvoiceItem.quantity,
+        *(type_coerce(column, BigInteger) for column in (InvoiceItem.subtotal, InvoiceItem.gst_amount,
+                                                          InvoiceItem.total))
+    ).join(Invoice, InvoiceItem.invoice_id == Invoice.id)
+    if user_id is not None:
+        stmt = stmt.where(Invoice.user_id == user_id)
+    if start:
+        stmt = stmt.where(Invoice.date >= start)
+    if end:
+        stmt = stmt.where(Invoice.date < end + timedelta(days=1))
+
+    # A Core select (no ORM row processing) fetched chunk by chunk
+    result = db.session.connection().execute(stmt.execution_options(stream_results=True))
+    for chunk in result.partitions(chunk_size):
+        months, rates, gstins, quantities, subtotals, gst_amounts, totals = zip(*chunk)
+        del chunk
+        yield (
+            array('q', map(int, months)), array('d', rates), [gstin or '' for gstin in gstins],
+            array('q', quantities), array('q', subtotals), array('q', gst_amounts), array('q', totals)
+        )
+
+
+def _reduce_numpy(columns, groups):
+    """Add one chunk's grouped sums to groups using vectorized NumPy operations"""
+    months, rates, gstins, quantities, subtotals, gst_amounts, totals = columns
+    month_keys, month_codes = np.unique(np.frombuffer(months, dtype=np.int64), return_inverse=True)
+    rate_keys, rate_codes = np.unique(np.frombuffer(rates, dtype=np.float64), return_inverse=True)
+    gstin_keys, gstin_codes = np.unique(np.array(gstins, dtype=object), return_inverse=True)
+
+    # One integer key per (month, rate, gstin) combination, then sum per key.
+    # bincount sums the integer weights as float64, which is exact below 2**53.
+    combined = (month_codes.astype(np.int64) * len(rate_keys) + rate_codes) * len(gstin_keys) + gstin_codes
+    group_keys, group_codes = np.unique(combined, return_inverse=True)
+    sums = [np.bincount(group_codes, minlength=len(group_keys))]
+    for values in (quantities, subtotals, gst_amounts, totals):
+        weights = np.frombuffer(values, dtype=np.int64)
+        sums.append(np.rint(np.bincount(group_codes, weights=weights, minlength=len(group_keys))).astype(np.int64))
+
+    rest, gstin_index = np.divmod(group_keys, len(gstin_keys))
+    month_index, rate_index = np.divmod(rest, len(rate_keys))
+    for i in range(len(group_keys)):
+        key = (int(month_keys[month_index[i]]), float(rate_keys[rate_index[i]]), gstin_keys[gstin_index[i]])
+        _add(groups, key, [int(column[i]) for column in sums])
+
+
+def _reduce_python(columns, groups):
+    """Add one chunk's grouped sums to groups with a single pass over the columns"""
+    for month, rate, gstin, quantity, subtotal, gst_amount, total in zip(*columns):
+        _add(groups, (month, rate, gstin), (1, quantity, subtotal, gst_amount, total))
+
+
+def _add(groups, key, values):
+    sums = groups.get(key)
+    if sums is None:
+        groups[key] = list(values)
+    else:
+        for i, value in enumerate(values):
+            sums[i] += value
+
+
+def gst_summary(user_id=None, start=None, end=None, chunk_size=CHUNK_SIZE, use_numpy=True):
+    """Return report rows sorted by month, GST rate and GSTIN"""
+    reduce_chunk = _reduce_numpy if use_numpy and np is not None else _reduce_python
+    groups = {}
+    for columns in iter_item_chunks(user_id=user_id, start=start, end=end, chunk_size=chunk_size):
+        reduce_chunk(columns, groups)
+
+    report = []
+    for (month, rate, gstin), sums in sorted(groups.items()):
+        row = {'month': f"{month // 100:04d}-{month % 100:02d}", 'gst_rate': rate, 'customer_gstin': gstin}
+        row.update(zip(SUM_FIELDS, sums))
+        for field in ('taxable_value', 'gst_amount', 'total'):
+            row[field] = from_paise(row[field])
+        report.append(row)
+    return report
+
+
+def report_csv(report):
+    """Render report rows as CSV text"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=GROUP_FIELDS + SUM_FIELDS)
+    writer.writeheader()
+    writer.writerows(report)
+    return output.getvalue()
+
+
+if __name__ == '__main__':
+    from app import app
+    from export_invoices import parse_date
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--start', type=parse_date, help='first invoice date (YYYY-MM-DD)')
+    parser.add_argument('--end', type=parse_date, help='last invoice date (YYYY-MM-DD)')
+    parser.add_argument('--username', help='only report this user\'s invoices')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--no-numpy', action='store_true', help='use the pure Python reducer')
+    parser.add_argument('-o', '--output', help='CSV output file (default: print a table)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_id = None
+        if args.username:
+            user = User.query.filter_by(username=args.username).first()
+            if not user:
+                sys.exit(f"User {args.username} not found")
+            user_id = user.id
+        started = time.perf_counter()
+        report = gst_summary(user_id=user_id, start=args.start, end=args.end,
+                             chunk_size=args.chunk_size, use_numpy=not args.no_numpy)
+        elapsed = time.perf_counter() - started
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            f.write(report_csv(report))
+    else:
+        print(f"{'month':<8} {'rate':>5} {'customer GSTIN':<16} {'lines':>8} {'taxable':>14} {'GST':>12} {'total':>14}")
+        for row in report:
+            print(f"{row['month']:<8} {row['gst_rate']:>5g} {row['customer_gstin'] or 'B2C':<16} "
+                  f"{row['line_count']:>8} {row['taxable_value']:>14.2f} {row['gst_amount']:>12.2f} "
+                  f"{row['total']:>14.2f}")
+    lines = sum(row['line_count'] for row in report)
+    print(f"{lines} line items in {len(report)} groups, {elapsed:.2f}s", file=sys.stderr)
@@ -0,0 +1,222 @@
+"""Bulk import products from CSV or JSON Lines.
+
+Rows are read as a stream, validated, and upserted by SKU in batches: one
+SELECT to find the existing SKUs of a batch, then one bulk INSERT and one
+bulk UPDATE (executemany) and a commit per batch. Invalid rows are skipped
+and reported with their line numbers; --dry-run validates and counts
+without writing anything:
+
+    python import_products.py catalog.csv
+    python import_products.py catalog.jsonl --dry-run --errors errors.csv
+
+Columns: sku, name, price, gst_rate, quantity (default 0), hidden (default false).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from decimal import InvalidOperation
+
+from sqlalchemy import column, table, text
+
+from money import to_money
+from models import db, Product
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+REQUIRED_FIELDS = ('sku', 'name', 'price', 'gst_rate')
+IMPORT_COLUMNS = ('sku', 'name', 'price', 'gst_rate', 'quantity', 'hidden')
+BATCH_SIZE = 1000
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', ''}
+
+# Typed like product so prices are staged as integer paise
+import_staging = table('product_import', *(column(name, Product.__table__.c[name].type) for name in IMPORT_COLUMNS))
+
+
+class ImportReport:
+    """Counts and per-row errors of an import run"""
+
+    def __init__(self, max_errors=1000):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+        self.max_errors = max_errors
+        self.elapsed = 0.0
+
+    def add_error(self, line, sku, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, sku, message))
+
+    def summary(self):
+        rate = self.rows / self.elapsed if self.elapsed else 0
+        return (f"{self.rows} rows in {self.elapsed:.2f}s ({rate:.0f} rows/s): "
+                f"{self.inserted} inserted, {self.updated} updated, {self.error_count} invalid")
+
+
+def detect_format(file_name):
+    extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+    return 'jsonl' if extension in ('jsonl', 'ndjson', 'json') else 'csv'
+
+
+def iter_rows(stream, import_format):
+    """Yield (line_number, row dict or None, error) from a text stream"""
+    if import_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+    elif import_format == 'jsonl':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, 'expected a JSON object'
+                continue
+            yield line_number, row, None
+    else:
+        raise ValueError(f"Unknown import format: {import_format}")
+
+
+def validate_row(row):
+    """Return (product values, None) or (None, error message) for one input row"""
+    for field in REQUIRED_FIELDS:
+        if row.get(field) in (None, ''):
+            return None, f"missing {field}"
+    sku = str(row['sku']).strip()
+    name = str(row['name']).strip()
+    if not sku or len(sku) > 64:
+        return None, 'sku must be 1-64 characters'
+    if not name or len(name) > 100:
+        return None, 'name must be 1-100 characters'
+    try:
+        price = to_money(row['price'])
+        gst_rate = float(row['gst_rate'])
+        quantity = int(row.get('quantity') or 0)
+    except (TypeError, ValueError, InvalidOperation):
+        return None, 'price, gst_rate and quantity must be numbers'
+    if price < 0:
+        return None, 'price must not be negative'
+    if not 0 <= gst_rate <= 28:
+        return None, 'gst_rate must be between 0 and 28'
+    if quantity < 0:
+        return None, 'quantity must not be negative'
+    hidden = row.get('hidden', False)
+    if not isinstance(hidden, bool):
+        hidden = str(hidden).strip().lower()
+        if hidden not in TRUE_VALUES | FALSE_VALUES:
+            return None, 'hidden must be true or false'
+        hidden = hidden in TRUE_VALUES
+    return {
+        'sku': sku, 'name': name, 'price': price, 'gst_rate': gst_rate,
+        'quantity': quantity, 'hidden': hidden
+    }, None
+
+
+def _insert_products(rows):
+    """Bulk insert new products.
+
+    On SQLite the rows go through a temporary staging table and into product
+    with a single INSERT ... SELECT: the product_search triggers then update
+    the FTS index once per statement instead of once per executemany row,
+    which is several times faster.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        db.session.execute(Product.__table__.insert(), rows)
+        return
+    columns = ', '.join(IMPORT_COLUMNS)
+    db.session.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS product_import ({columns})"))
+    db.session.execute(import_staging.insert(), rows)
+    db.session.execute(text(f"INSERT INTO product ({columns}) SELECT {columns} FROM product_import"))
+    db.session.execute(text("DELETE FROM product_import"))
+
+
+def _write_batch(batch, report, dry_run):
+    """Upsert a batch of {sku: values} with one SELECT, one INSERT and one UPDATE"""
+    existing = dict(
+        db.session.query(Product.sku, Product.id).filter(Product.sku.in_(list(batch)))
+    )
+    inserts = [values for sku, values in batch.items() if sku not in existing]
+    updates = [dict(values, id=existing[sku]) for sku, values in batch.items() if sku in existing]
+    if not dry_run:
+        if inserts:
+            _insert_products(inserts)
+        if updates:
+            db.session.bulk_update_mappings(Product, updates)
+        db.session.commit()
+    report.inserted += len(inserts)
+    report.updated += len(updates)
+
+
+def import_products(stream, import_format='csv', dry_run=False, batch_size=BATCH_SIZE, max_errors=1000):
+    """Validate and upsert products from a text stream; returns an ImportReport.
+
+    Each batch is committed on its own, so a failed run keeps the batches
+    written before it. A SKU repeated within a batch keeps its last row.
+    """
+    report = ImportReport(max_errors=max_errors)
+    started = time.perf_counter()
+    batch = {}
+    try:
+        for line_number, row, error in iter_rows(stream, import_format):
+            report.rows += 1
+            values = None
+            if not error:
+                values, error = validate_row(row)
+            if error:
+                report.add_error(line_number, (row or {}).get('sku', ''), error)
+                continue
+            batch[values['sku']] = values
+            if len(batch) >= batch_size:
+                _write_batch(batch, report, dry_run)
+                batch = {}
+        if batch:
+            _write_batch(batch, report, dry_run)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if dry_run:
+            db.session.rollback()
+        report.elapsed = time.perf_counter() - started
+    return report
+
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='CSV or JSON Lines file')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='default: from the file extension')
+    parser.add_argument('--dry-run', action='store_true', help='validate and count without writing')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--errors', help='write invalid rows to this CSV file')
+    args = parser.parse_args()
+
+    with app.app_context(), open(args.path, newline='', encoding='utf-8-sig') as stream:
+        report = import_products(
+            stream,
+            import_format=args.format or detect_format(args.path),
+            dry_run=args.dry_run,
+            batch_size=args.batch_size,
+            max_errors=sys.maxsize if args.errors else 20
+        )
+    print(('Dry run: ' if args.dry_run else '') + report.summary())
+    if args.errors:
+        with open(args.errors, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['line', 'sku', 'error'])
+            writer.writerows(report.errors)
+    else:
+        for line, sku, message in report.errors:
+            print(f"  line {line} ({sku or 'no sku'}): {message}")
+    if report.error_count:
+        sys.exit(1)
@@ -0,0 +1,206 @@
+"""Per-request timing of SQL, PDF rendering and cookies.
+
+When INSTRUMENTATION is on, every request records its wall time, the number
+and total time of its SQL statements, the time and size of any PDFs it
+renders, and the size of the cookies it received and set. Each response
+gets a Server-Timing header (shown in the browser's network panel) with the
+figures up to the headers, and the figures of the whole response, streamed
+bodies included, are aggregated into histograms served in the Prometheus
+text format at /metrics. Metrics are per process; with several Gunicorn
+workers scrape each one or sum them in Prometheus.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, abort, has_request_context, request
+from sqlalchemy import event
+from werkzeug.wsgi import ClosingIterator
+
+import generate_invoice
+from models import db
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 2048, 4096, 8192, 16384, 65536, 262144, 1048576)
+ENVIRON_KEY = 'billing.request_stats'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label tuple"""
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self._series = {}
+
+    def observe(self, value, labels=()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+        series['counts'][bisect_left(self.buckets, value)] += 1
+        series['sum'] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            prefix = f"{label_text}," if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series['counts']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            suffix = f"{{{label_text}}}" if label_text else ''
+            lines.append(f"{self.name}_sum{suffix} {series['sum']:.6f}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class RequestStats:
+    """Figures collected while one request is handled"""
+    __slots__ = ('started', 'sql_count', 'sql_time', 'render_count', 'render_time', 'render_bytes')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.render_count = 0
+        self.render_time = 0.0
+        self.render_bytes = 0
+
+
+def _current_stats():
+    return request.environ.get(ENVIRON_KEY) if has_request_context() else None
+
+
+class Instrumentation:
+    """WSGI middleware plus SQLAlchemy and renderer hooks feeding the histograms"""
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self._lock = threading.Lock()
+        labels = ('endpoint', 'method')
+        self.request_duration = Histogram(
+            'billing_request_duration_seconds', 'Request wall time', DURATION_BUCKETS, labels)
+        self.sql_queries = Histogram(
+            'billing_request_sql_queries', 'SQL statements per request', COUNT_BUCKETS, labels)
+        self.sql_duration = Histogram(
+            'billing_request_sql_duration_seconds', 'SQL time per request', DURATION_BUCKETS, labels)
+        self.request_cookie_bytes = Histogram(
+            'billing_request_cookie_bytes', 'Size of the Cookie request header', SIZE_BUCKETS, labels)
+        self.response_cookie_bytes = Histogram(
+            'billing_response_cookie_bytes', 'Size of the Set-Cookie response headers', SIZE_BUCKETS, labels)
+        self.render_duration = Histogram(
+            'billing_pdf_render_duration_seconds', 'Invoice PDF render time, including background renders',
+            DURATION_BUCKETS)
+        self.pdf_bytes = Histogram('billing_pdf_size_bytes', 'Rendered invoice PDF size', SIZE_BUCKETS)
+        self.histograms = [
+            self.request_duration, self.sql_queries, self.sql_duration, self.request_cookie_bytes,
+            self.response_cookie_bytes, self.render_duration, self.pdf_bytes,
+        ]
+        self.requests_total = {}
+
+    def __call__(self, environ, start_response):
+        stats = environ[ENVIRON_KEY] = RequestStats()
+        response = {}
+
+        def instrumented_start_response(status, headers, exc_info=None):
+            # Called by Flask while the request context is still active
+            elapsed = time.perf_counter() - stats.started
+            response['endpoint'] = (request.endpoint if has_request_context() else None) or 'unmatched'
+            response['status'] = status.split(' ', 1)[0]
+            response['set_cookie_bytes'] = sum(len(value) for name, value in headers
+                                               if name.lower() == 'set-cookie')
+            headers.append(('Server-Timing', self.server_timing(stats, elapsed)))
+            return start_response(status, headers, exc_info)
+
+        def record_response():
+            # Streamed bodies run their queries after the headers have gone
+            # out, so the histograms are fed once the body has been sent
+            if response:
+                self.record(response['endpoint'], environ.get('REQUEST_METHOD', ''), response['status'],
+                            stats, time.perf_counter() - stats.started, len(environ.get('HTTP_COOKIE', '')),
+                            response['set_cookie_bytes'])
+
+        return ClosingIterator(self.wsgi_app(environ, instrumented_start_response), record_response)
+
+    @staticmethod
+    def server_timing(stats, elapsed):
+        timings = [
+            f"app;dur={elapsed * 1000:.1f}",
+            f'sql;dur={stats.sql_time * 1000:.1f};desc="{stats.sql_count} queries"',
+        ]
+        if stats.render_count:
+            timings.append(f'pdf;dur={stats.render_time * 1000:.1f};desc="{stats.render_bytes} bytes"')
+        return ', '.join(timings)
+
+    def record(self, endpoint, method, status, stats, elapsed, cookie_bytes, set_cookie_bytes):
+        labels = (endpoint, method)
+        with self._lock:
+            self.request_duration.observe(elapsed, labels)
+            self.sql_queries.observe(stats.sql_count, labels)
+            self.sql_duration.observe(stats.sql_time, labels)
+            self.request_cookie_bytes.observe(cookie_bytes, labels)
+            self.response_cookie_bytes.observe(set_cookie_bytes, labels)
+            key = (endpoint, method, status)
+            self.requests_total[key] = self.requests_total.get(key, 0) + 1
+
+    def observe_render(self, invoice, seconds, size):
+        with self._lock:
+            self.render_duration.observe(seconds)
+            self.pdf_bytes.observe(size)
+        stats = _current_stats()
+        if stats is not None:
+            stats.render_count += 1
+            stats.render_time += seconds
+            stats.render_bytes += size
+
+    @staticmethod
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's execution context, so a statement that
+        # raises leaves nothing behind on the pooled connection
+        context._query_started = time.perf_counter()
+
+    @staticmethod
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        stats = _current_stats()
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_time += elapsed
+
+    def expose(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = ['# HELP billing_requests_total Requests handled',
+                     '# TYPE billing_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests_total.items()):
+                lines.append(f'billing_requests_total{{endpoint="{endpoint}",method="{method}",'
+                             f'status="{status}"}} {count}')
+            for histogram in self.histograms:
+                lines.extend(histogram.expose())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        token = self.app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            abort(401)
+        return Response(self.expose(), mimetype='text/plain; version=0.0.4')
+
+
+def init_instrumentation(app):
+    """Install the middleware, hooks and /metrics endpoint if INSTRUMENTATION is on"""
+    if not app.config.get('INSTRUMENTATION'):
+        return None
+    instrumentation = Instrumentation(app)
+    app.wsgi_app = instrumentation
+    engine = db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', instrumentation.before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', instrumentation.after_cursor_execute)
+    generate_invoice.render_observers.append(instrumentation.observe_render)
+    app.add_url_rule('/metrics', 'metrics', instrumentation.metrics_view)
+    app.extensions['instrumentation'] = instrumentation
+    return instrumentation
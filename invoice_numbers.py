@@ -0,0 +1,82 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Invoice, InvoiceCounter
+
+
+def format_invoice_number(year, seq):
+    return f'INV{year}-{str(seq).zfill(4)}'
+
+
+def last_used_sequence(conn, year):
+    """Highest sequence already used by INV{year}-NNNN invoices (one-time scan when seeding)"""
+    prefix = f'INV{year}-'
+    last_seq = 0
+    numbers = conn.execute(
+        select(Invoice.invoice_number).where(Invoice.invoice_number.like(f'{prefix}%'))
+    )
+    for (number,) in numbers:
+        suffix = number[len(prefix):]
+        if suffix.isdigit():
+            last_seq = max(last_seq, int(suffix))
+    return last_seq
+
+
+class InvoiceNumberAllocator:
+    """Allocates invoice numbers from the per-year invoice_counter row.
+
+    Each allocation is a single atomic UPDATE of the counter, so concurrent
+    workers can never hand out the same number. With block_size 1 the
+    update runs in the caller's transaction and is rolled back with a failed
+    checkout, keeping numbers gapless. A larger block_size reserves that
+    many numbers per worker in a separate short transaction and serves them
+    from memory; numbers of an unused block are skipped (not reused).
+    """
+
+    def __init__(self, block_size=1):
+        self.block_size = max(1, int(block_size))
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def next_number(self, year=None):
+        year = year or datetime.now().year
+        if self.block_size == 1:
+            return format_invoice_number(year, self._reserve(db.session, year, 1))
+
+        with self._lock:
+            next_seq, end = self._blocks.get(year, (1, 0))
+            if next_seq > end:
+                with db.engine.begin() as conn:
+                    end = self._reserve(conn, year, self.block_size)
+                next_seq = end - self.block_size + 1
+            self._blocks[year] = (next_seq + 1, end)
+        return format_invoice_number(year, next_seq)
+
+    def _reserve(self, conn, year, count):
+        """Atomically add count to the year's counter and return the new last value.
+
+        conn is the session or a connection whose transaction the update joins.
+        """
+        counter = InvoiceCounter.__table__
+        result = conn.execute(
+            counter.update()
+            .where(counter.c.year == year)
+            .values(last_value=counter.c.last_value + count)
+        )
+        if result.rowcount == 0:
+            # First invoice of the year: seed the counter from existing invoices
+            try:
+                with conn.begin_nested():
+                    conn.execute(counter.insert().values(
+                        year=year,
+                        last_value=last_used_sequence(conn, year) + count
+                    ))
+            except IntegrityError:
+                # Another worker seeded it first
+                return self._reserve(conn, year, count)
+        return conn.execute(
+            select(counter.c.last_value).where(counter.c.year == year)
+        ).scalar()
@@ -0,0 +1,71 @@
+"""Move invoice PDF blobs out of the database into PDF storage
+
+Revision ID: 3f9a1c2e7b40
+Revises: d83221177d0b
+Create Date: 2026-10-18 09:12:31.204517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2e7b40'
+down_revision = 'd83221177d0b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('invoicePDF', sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    # Write every stored blob to the PDF storage backend and keep only its key
+    storage = current_app.extensions['pdf_storage']
+    conn = op.get_bind()
+    invoice_pdf = sa.table(
+        'invoicePDF',
+        sa.column('id', sa.Integer),
+        sa.column('pdf_data', sa.LargeBinary),
+        sa.column('content_hash', sa.String),
+    )
+    ids = [row.id for row in conn.execute(sa.select(invoice_pdf.c.id))]
+    for pdf_id in ids:
+        pdf_data = conn.execute(
+            sa.select(invoice_pdf.c.pdf_data).where(invoice_pdf.c.id == pdf_id)
+        ).scalar()
+        conn.execute(
+            invoice_pdf.update()
+            .where(invoice_pdf.c.id == pdf_id)
+            .values(content_hash=storage.save(pdf_data))
+        )
+
+    with op.batch_alter_table('invoicePDF') as batch_op:
+        batch_op.alter_column('content_hash', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_index('ix_invoicePDF_content_hash', ['content_hash'])
+        batch_op.drop_column('pdf_data')
+
+
+def downgrade():
+    op.add_column('invoicePDF', sa.Column('pdf_data', sa.LargeBinary(), nullable=True))
+
+    storage = current_app.extensions['pdf_storage']
+    conn = op.get_bind()
+    invoice_pdf = sa.table(
+        'invoicePDF',
+        sa.column('id', sa.Integer),
+        sa.column('pdf_data', sa.LargeBinary),
+        sa.column('content_hash', sa.String),
+    )
+    rows = conn.execute(sa.select(invoice_pdf.c.id, invoice_pdf.c.content_hash)).fetchall()
+    for row in rows:
+        conn.execute(
+            invoice_pdf.update()
+            .where(invoice_pdf.c.id == row.id)
+            .values(pdf_data=storage.read(row.content_hash))
+        )
+
+    with op.batch_alter_table('invoicePDF') as batch_op:
+        batch_op.alter_column('pdf_data', existing_type=sa.LargeBinary(), nullable=False)
+        batch_op.drop_index('ix_invoicePDF_content_hash')
+        batch_op.drop_column('content_hash')
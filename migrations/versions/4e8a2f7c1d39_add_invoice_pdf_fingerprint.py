@@ -0,0 +1,28 @@
+"""Add invoicePDF.fingerprint so stored PDFs are reused while current
+
+Revision ID: 4e8a2f7c1d39
+Revises: 9d4c6b2e8f15
+Create Date: 2026-10-18 21:12:48.935102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8a2f7c1d39'
+down_revision = '9d4c6b2e8f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing PDFs have no fingerprint and are rendered again on first use
+    inspector = sa.inspect(op.get_bind())
+    if 'fingerprint' not in {column['name'] for column in inspector.get_columns('invoicePDF')}:
+        op.add_column('invoicePDF', sa.Column('fingerprint', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('invoicePDF') as batch_op:
+        batch_op.drop_column('fingerprint')
@@ -0,0 +1,53 @@
+"""Add per-year invoice_counter table for invoice number allocation
+
+Revision ID: 5b7e2d9c4a18
+Revises: 3f9a1c2e7b40
+Create Date: 2026-10-18 11:40:05.918244
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2d9c4a18'
+down_revision = '3f9a1c2e7b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the table may already exist
+    conn = op.get_bind()
+    if 'invoice_counter' not in sa.inspect(conn).get_table_names():
+        op.create_table(
+            'invoice_counter',
+            sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('last_value', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('year')
+        )
+    invoice_counter = sa.table(
+        'invoice_counter',
+        sa.column('year', sa.Integer),
+        sa.column('last_value', sa.Integer),
+    )
+
+    # Seed each year's counter with the highest INV{year}-NNNN number in use
+    last_values = {}
+    for (number,) in conn.execute(sa.text("SELECT invoice_number FROM invoice WHERE invoice_number LIKE 'INV%-%'")):
+        match = re.fullmatch(r'INV(\d{4})-(\d+)', number)
+        if match:
+            year, seq = int(match.group(1)), int(match.group(2))
+            last_values[year] = max(last_values.get(year, 0), seq)
+    seeded = {year for (year,) in conn.execute(sa.select(invoice_counter.c.year))}
+    last_values = {year: value for year, value in last_values.items() if year not in seeded}
+    if last_values:
+        op.bulk_insert(invoice_counter, [
+            {'year': year, 'last_value': last_value} for year, last_value in last_values.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('invoice_counter')
@@ -0,0 +1,27 @@
+"""Index cart_line.updated_at for purging abandoned carts
+
+Revision ID: 6f1b3d8a2c57
+Revises: 4e8a2f7c1d39
+Create Date: 2026-10-18 22:41:09.517364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1b3d8a2c57'
+down_revision = '4e8a2f7c1d39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, which creates this on new databases
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_cart_line_updated_at' not in {index['name'] for index in inspector.get_indexes('cart_line')}:
+        op.create_index('ix_cart_line_updated_at', 'cart_line', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cart_line_updated_at', table_name='cart_line')
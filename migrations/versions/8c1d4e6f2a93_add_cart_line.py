@@ -0,0 +1,41 @@
+"""Add cart_line table for the server-side cart store
+
+Revision ID: 8c1d4e6f2a93
+Revises: 5b7e2d9c4a18
+Create Date: 2026-10-18 12:25:41.306127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1d4e6f2a93'
+down_revision = '5b7e2d9c4a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the table may already exist
+    conn = op.get_bind()
+    if 'cart_line' not in sa.inspect(conn).get_table_names():
+        op.create_table(
+            'cart_line',
+            sa.Column('cart_id', sa.String(length=32), nullable=False),
+            sa.Column('product_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('price', sa.Float(), nullable=False),
+            sa.Column('gst_rate', sa.Float(), nullable=False),
+            sa.Column('qty', sa.Integer(), nullable=False),
+            sa.Column('subtotal', sa.Float(), nullable=False),
+            sa.Column('gst_amount', sa.Float(), nullable=False),
+            sa.Column('total', sa.Float(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('cart_id', 'product_id')
+        )
+
+
+def downgrade():
+    op.drop_table('cart_line')
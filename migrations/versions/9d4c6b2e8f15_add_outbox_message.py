@@ -0,0 +1,48 @@
+"""Add outbox_message table for queued email and SMS notifications
+
+Revision ID: 9d4c6b2e8f15
+Revises: b3d7f1a9c254
+Create Date: 2026-10-18 20:05:17.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4c6b2e8f15'
+down_revision = 'b3d7f1a9c254'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the table may already exist
+    conn = op.get_bind()
+    if 'outbox_message' not in sa.inspect(conn).get_table_names():
+        op.create_table(
+            'outbox_message',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('channel', sa.String(length=10), nullable=False),
+            sa.Column('recipient', sa.String(length=255), nullable=False),
+            sa.Column('subject', sa.String(length=200), nullable=True),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('invoice_id', sa.Integer(), nullable=True),
+            sa.Column('attachment_hash', sa.String(length=64), nullable=True),
+            sa.Column('attachment_name', sa.String(length=100), nullable=True),
+            sa.Column('status', sa.String(length=10), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+            sa.Column('claim_token', sa.String(length=32), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_outbox_message_status_next_attempt', 'outbox_message',
+                        ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_message_status_next_attempt', table_name='outbox_message')
+    op.drop_table('outbox_message')
@@ -0,0 +1,50 @@
+"""Add FTS5 trigram search index on product names
+
+Revision ID: a4e9b7c13d52
+Revises: 8c1d4e6f2a93
+Create Date: 2026-10-18 13:02:17.540391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e9b7c13d52'
+down_revision = '8c1d4e6f2a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The index is SQLite-only; other databases keep using ILIKE
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+        "name, content='product', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product BEGIN "
+        "INSERT INTO product_search(rowid, name) VALUES (new.id, new.name); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product BEGIN "
+        "INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE OF name ON product BEGIN "
+        "INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO product_search(rowid, name) VALUES (new.id, new.name); END"
+    )
+    op.execute("INSERT INTO product_search(product_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    for trigger in ('product_search_ai', 'product_search_ad', 'product_search_au'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS product_search")
@@ -0,0 +1,121 @@
+"""Store money amounts as integer paise
+
+Converts the Float money columns to BIGINT paise and rebuilds the sales
+aggregates from the converted invoices, so their sums are exact. Amounts are
+cast to NUMERIC before rounding to the paisa, so PostgreSQL rounds half away
+from zero like the app's Decimal rounding; SQLite keeps the stored double and
+rounds its binary value half away from zero.
+
+Revision ID: b3d7f1a9c254
+Revises: f5a3c9e2d817
+Create Date: 2026-10-18 16:05:39.118270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d7f1a9c254'
+down_revision = 'f5a3c9e2d817'
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = {
+    'product': ['price'],
+    'invoice': ['total_amount', 'gst_amount'],
+    'invoice_item': ['unit_price', 'subtotal', 'gst_amount', 'total'],
+    'cart_line': ['price', 'subtotal', 'gst_amount', 'total'],
+}
+AGGREGATE_COLUMNS = {
+    'user_sales_total': ['revenue', 'gst_amount'],
+    'daily_sales': ['revenue', 'gst_amount'],
+    'daily_product_sales': ['revenue', 'gst_amount'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in MONEY_COLUMNS.items():
+        # Tables created by db.create_all() on app import already use paise
+        float_columns = [
+            column['name'] for column in inspector.get_columns(table)
+            if column['name'] in columns and not isinstance(column['type'], sa.Integer)
+        ]
+        if not float_columns:
+            continue
+        # ROUND on a double precision rounds half to even on PostgreSQL; on a
+        # numeric it rounds half away from zero like the app's Decimal rounding
+        op.execute(f"UPDATE {table} SET " + ', '.join(
+            f"{name} = ROUND(CAST({name} AS NUMERIC) * 100)" for name in float_columns
+        ))
+        _alter_types(table, float_columns, sa.Float(), sa.BigInteger())
+
+    for table, columns in AGGREGATE_COLUMNS.items():
+        float_columns = [
+            column['name'] for column in inspector.get_columns(table)
+            if column['name'] in columns and not isinstance(column['type'], sa.Integer)
+        ]
+        if float_columns:
+            _alter_types(table, float_columns, sa.Float(), sa.BigInteger())
+    _rebuild_aggregates()
+
+
+def downgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        _alter_types(table, columns, sa.BigInteger(), sa.Float())
+        op.execute(f"UPDATE {table} SET " + ', '.join(f"{name} = {name} / 100.0" for name in columns))
+    for table, columns in AGGREGATE_COLUMNS.items():
+        _alter_types(table, columns, sa.BigInteger(), sa.Float())
+    _rebuild_aggregates()
+
+
+def _alter_types(table, columns, existing_type, type_):
+    cast = 'bigint' if isinstance(type_, sa.Integer) else 'double precision'
+    with op.batch_alter_table(table) as batch_op:
+        for name in columns:
+            batch_op.alter_column(name, existing_type=existing_type, type_=type_, existing_nullable=False,
+                                  postgresql_using=f"{name}::{cast}")
+    if table == 'product' and op.get_bind().dialect.name == 'sqlite':
+        _create_search_triggers()
+
+
+def _create_search_triggers():
+    # Rebuilding the product table on SQLite drops the product_search triggers;
+    # the rows keep their ids, so the index itself is still valid
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product BEGIN "
+        "INSERT INTO product_search(rowid, name) VALUES (new.id, new.name); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product BEGIN "
+        "INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE OF name ON product "
+        "WHEN old.name IS NOT new.name BEGIN "
+        "INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO product_search(rowid, name) VALUES (new.id, new.name); END"
+    )
+
+
+def _rebuild_aggregates():
+    # Same as sales_aggregates.rebuild_aggregates, from the converted invoices
+    for table in AGGREGATE_COLUMNS:
+        op.execute(f"DELETE FROM {table}")
+    op.execute(
+        "INSERT INTO user_sales_total (user_id, invoice_count, revenue, gst_amount) "
+        "SELECT user_id, count(id), sum(total_amount), sum(gst_amount) FROM invoice GROUP BY user_id"
+    )
+    op.execute(
+        "INSERT INTO daily_sales (user_id, day, invoice_count, revenue, gst_amount) "
+        "SELECT user_id, date(date), count(id), sum(total_amount), sum(gst_amount) "
+        "FROM invoice GROUP BY user_id, date(date)"
+    )
+    op.execute(
+        "INSERT INTO daily_product_sales (product_id, day, quantity, revenue, gst_amount) "
+        "SELECT invoice_item.product_id, date(invoice.date), sum(invoice_item.quantity), "
+        "sum(invoice_item.total), sum(invoice_item.gst_amount) "
+        "FROM invoice_item JOIN invoice ON invoice.id = invoice_item.invoice_id "
+        "GROUP BY invoice_item.product_id, date(invoice.date)"
+    )
@@ -0,0 +1,30 @@
+"""Add indexes for keyset pagination of invoices and their PDFs
+
+Revision ID: c7f25a8e1b64
+Revises: a4e9b7c13d52
+Create Date: 2026-10-18 13:48:52.113904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f25a8e1b64'
+down_revision = 'a4e9b7c13d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, which creates these on new databases
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_invoice_user_date_id' not in {index['name'] for index in inspector.get_indexes('invoice')}:
+        op.create_index('ix_invoice_user_date_id', 'invoice', ['user_id', 'date', 'id'], unique=False)
+    if 'ix_invoicePDF_invoice_id' not in {index['name'] for index in inspector.get_indexes('invoicePDF')}:
+        op.create_index('ix_invoicePDF_invoice_id', 'invoicePDF', ['invoice_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_invoicePDF_invoice_id', table_name='invoicePDF')
+    op.drop_index('ix_invoice_user_date_id', table_name='invoice')
@@ -0,0 +1,49 @@
+"""Add product.sku as the upsert key for bulk product imports
+
+Also limits the product_search update trigger to real name changes, so
+re-importing a catalog doesn't re-index unchanged names.
+
+Revision ID: e2b8d4f6a0c7
+Revises: c7f25a8e1b64
+Create Date: 2026-10-18 14:31:06.274518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8d4f6a0c7'
+down_revision = 'c7f25a8e1b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A unique index rather than a constraint: adding a constraint would make
+    # SQLite rebuild the product table and drop the product_search triggers
+    inspector = sa.inspect(op.get_bind())
+    if 'sku' not in {column['name'] for column in inspector.get_columns('product')}:
+        op.add_column('product', sa.Column('sku', sa.String(length=64), nullable=True))
+    if 'ix_product_sku' not in {index['name'] for index in inspector.get_indexes('product')}:
+        op.create_index('ix_product_sku', 'product', ['sku'], unique=True)
+    if op.get_bind().dialect.name == 'sqlite':
+        _replace_update_trigger('WHEN old.name IS NOT new.name ')
+
+
+def downgrade():
+    op.drop_index('ix_product_sku', table_name='product')
+    # Rebuilds the product table on SQLite; the app recreates the search triggers on start
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_column('sku')
+    if op.get_bind().dialect.name == 'sqlite':
+        _replace_update_trigger('')
+
+
+def _replace_update_trigger(condition):
+    op.execute("DROP TRIGGER IF EXISTS product_search_au")
+    op.execute(
+        f"CREATE TRIGGER product_search_au AFTER UPDATE OF name ON product {condition}BEGIN "
+        "INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO product_search(rowid, name) VALUES (new.id, new.name); END"
+    )
@@ -0,0 +1,80 @@
+"""Add sales aggregate tables for the dashboard
+
+Revision ID: f5a3c9e2d817
+Revises: e2b8d4f6a0c7
+Create Date: 2026-10-18 15:12:44.608215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a3c9e2d817'
+down_revision = 'e2b8d4f6a0c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # app.py runs db.create_all() on import, so the tables may already exist
+    conn = op.get_bind()
+    tables = sa.inspect(conn).get_table_names()
+    if 'user_sales_total' not in tables:
+        op.create_table(
+            'user_sales_total',
+            sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('invoice_count', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('gst_amount', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('user_id')
+        )
+    if 'daily_sales' not in tables:
+        op.create_table(
+            'daily_sales',
+            sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('invoice_count', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('gst_amount', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('user_id', 'day')
+        )
+    if 'daily_product_sales' not in tables:
+        op.create_table(
+            'daily_product_sales',
+            sa.Column('product_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('gst_amount', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id']),
+            sa.PrimaryKeyConstraint('product_id', 'day')
+        )
+
+    # Backfill from invoice history (same as sales_aggregates.rebuild_aggregates)
+    for table in ('user_sales_total', 'daily_sales', 'daily_product_sales'):
+        op.execute(f"DELETE FROM {table}")
+    op.execute(
+        "INSERT INTO user_sales_total (user_id, invoice_count, revenue, gst_amount) "
+        "SELECT user_id, count(id), sum(total_amount), sum(gst_amount) FROM invoice GROUP BY user_id"
+    )
+    op.execute(
+        "INSERT INTO daily_sales (user_id, day, invoice_count, revenue, gst_amount) "
+        "SELECT user_id, date(date), count(id), sum(total_amount), sum(gst_amount) "
+        "FROM invoice GROUP BY user_id, date(date)"
+    )
+    op.execute(
+        "INSERT INTO daily_product_sales (product_id, day, quantity, revenue, gst_amount) "
+        "SELECT invoice_item.product_id, date(invoice.date), sum(invoice_item.quantity), "
+        "sum(invoice_item.total), sum(invoice_item.gst_amount) "
+        "FROM invoice_item JOIN invoice ON invoice.id = invoice_item.invoice_id "
+        "GROUP BY invoice_item.product_id, date(invoice.date)"
+    )
+
+
+def downgrade():
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_sales')
+    op.drop_table('user_sales_total')
@@ -1,8 +1,11 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import configure_mappers, selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from money import Money
+
 # Initialize SQLAlchemy without binding to a specific app
 db = SQLAlchemy()
 
@@ -32,14 +35,19 @@ class User(UserMixin, db.Model):
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    # Supplier stock-keeping unit, the upsert key for bulk imports
+    sku = db.Column(db.String(64), unique=True, index=True)
     name = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(Money, nullable=False)
     gst_rate = db.Column(db.Float, nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=0)
     hidden = db.Column(db.Boolean, nullable=False, default=False)
     invoice_items = db.relationship('InvoiceItem', backref='product', lazy=True)
 
 class Invoice(db.Model):
+    # Backs the newest-first keyset pagination of a user's invoices
+    __table_args__ = (db.Index('ix_invoice_user_date_id', 'user_id', 'date', 'id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(20), unique=True, nullable=False)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -51,30 +59,105 @@ class Invoice(db.Model):
     status = db.Column(db.String(20), default='PENDING')
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     items = db.relationship('InvoiceItem', backref='invoice', lazy=True, cascade='all, delete-orphan')
-    total_amount = db.Column(db.Float, nullable=False)
-    gst_amount = db.Column(db.Float, nullable=False)
+    total_amount = db.Column(Money, nullable=False)
+    gst_amount = db.Column(Money, nullable=False)
     pdfs = db.relationship('InvoicePDF', backref='invoice', lazy=True, cascade='all, delete-orphan')
 
     @property
     def subtotal(self):
         return sum(item.subtotal for item in self.items)
 
+class InvoiceCounter(db.Model):
+    """Last invoice sequence number allocated for each year"""
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
 class InvoiceItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     product_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    unit_price = db.Column(db.Float, nullable=False)
+    unit_price = db.Column(Money, nullable=False)
+    gst_rate = db.Column(db.Float, nullable=False)
+    subtotal = db.Column(Money, nullable=False)
+    gst_amount = db.Column(Money, nullable=False)
+    total = db.Column(Money, nullable=False)
+
+class CartLine(db.Model):
+    """Line item of a server-side cart, keyed by the cart id kept in the session"""
+    cart_id = db.Column(db.String(32), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    price = db.Column(Money, nullable=False)
     gst_rate = db.Column(db.Float, nullable=False)
-    subtotal = db.Column(db.Float, nullable=False)
-    gst_amount = db.Column(db.Float, nullable=False)
-    total = db.Column(db.Float, nullable=False)
+    qty = db.Column(db.Integer, nullable=False)
+    subtotal = db.Column(Money, nullable=False)
+    gst_amount = db.Column(Money, nullable=False)
+    total = db.Column(Money, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Indexed for purging abandoned carts
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           index=True)
 
 class InvoicePDF(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
-    pdf_data = db.Column(db.LargeBinary, nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False, index=True)
+    # SHA-256 key of the PDF in the configured PDF storage backend
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    # SHA-256 of the invoice content and render options the PDF was rendered from
+    fingerprint = db.Column(db.String(64))
     file_name = db.Column(db.String(100), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) 
\ No newline at end of file
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class UserSalesTotal(db.Model):
+    """Running sales totals per user, kept up to date at checkout"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, autoincrement=False)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Money, nullable=False, default=0)
+    gst_amount = db.Column(Money, nullable=False, default=0)
+
+class DailySales(db.Model):
+    """Sales per user per day, kept up to date at checkout"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Money, nullable=False, default=0)
+    gst_amount = db.Column(Money, nullable=False, default=0)
+
+class DailyProductSales(db.Model):
+    """Units and revenue per product per day, kept up to date at checkout"""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Money, nullable=False, default=0)
+    gst_amount = db.Column(Money, nullable=False, default=0)
+
+class OutboxMessage(db.Model):
+    """Email or SMS waiting for the notification dispatcher to deliver it"""
+    # Backs the dispatcher's "due messages" query
+    __table_args__ = (db.Index('ix_outbox_message_status_next_attempt', 'status', 'next_attempt_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)  # 'email' or 'sms'
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(200))
+    body = db.Column(db.Text, nullable=False)
+    # Emails attach the invoice's stored PDF, or a PDF saved in PDF storage
+    invoice_id = db.Column(db.Integer)
+    attachment_hash = db.Column(db.String(64))
+    attachment_name = db.Column(db.String(100))
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+# Loading profiles for invoice views. Items come from one extra SELECT ... IN
+# query, so the number of queries doesn't grow with the number of items.
+configure_mappers()  # set up the backrefs used below
+INVOICE_WITH_ITEMS = selectinload(Invoice.items)
+INVOICE_WITH_ITEM_PRODUCTS = selectinload(Invoice.items).joinedload(InvoiceItem.product)
@@ -0,0 +1,58 @@
+"""Exact money amounts stored as integer paise.
+
+Amounts are Decimals with two places in Python and whole paise (BIGINT) in
+the database, so totals are exact integer SUMs in SQL and amounts compare
+equal without a tolerance. GST is charged per line on the taxable value and
+rounded half up to the paisa; invoice totals are sums of the rounded lines.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy.types import BigInteger, TypeDecorator
+
+PAISA = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def to_money(value):
+    """Return value as Decimal rupees rounded half up to the paisa.
+
+    Floats are converted through their shortest repr, so 19.99 stays 19.99
+    rather than becoming 19.989999999999998436805981327779591083526611328125.
+    """
+    if isinstance(value, float):
+        value = repr(value)
+    return Decimal(value).quantize(PAISA, rounding=ROUND_HALF_UP)
+
+
+def to_paise(value):
+    return int(to_money(value).scaleb(2))
+
+
+def from_paise(paise):
+    return Decimal(int(paise)).scaleb(-2)
+
+
+def gst_for(taxable_value, gst_rate):
+    """GST on a taxable value at a percentage rate, rounded half up to the paisa"""
+    rate = Decimal(repr(gst_rate)) if isinstance(gst_rate, float) else Decimal(gst_rate)
+    return to_money(to_money(taxable_value) * rate / 100)
+
+
+def line_amounts(price, quantity, gst_rate):
+    """Return (subtotal, gst_amount, total) of quantity units at price"""
+    subtotal = to_money(price) * quantity
+    gst_amount = gst_for(subtotal, gst_rate)
+    return subtotal, gst_amount, subtotal + gst_amount
+
+
+class Money(TypeDecorator):
+    """Decimal rupees in Python, integer paise in the database"""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_paise(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_paise(value)
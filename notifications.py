@@ -0,0 +1,342 @@
+"""Outbox delivery of email and SMS notifications.
+
+Request handlers only add OutboxMessage rows to their own transaction; a
+dispatcher thread per process claims due messages, sends emails over one
+reused SMTP connection and SMS through a pooled requests.Session (one
+Fast2SMS call per message text for up to SMS_BATCH_SIZE numbers), and
+retries failures with exponential backoff. Claims are leased, so several
+workers can share the outbox and a crashed worker's messages are picked
+up again.
+
+Run the dispatcher on its own (e.g. with NOTIFY_WORKER=0 in the web
+processes) with:
+
+    python notifications.py
+    python notifications.py --once
+"""
+import argparse
+import logging
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import requests
+from sqlalchemy import event
+
+from models import db, OutboxMessage
+from pdf_storage import get_pdf_storage
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_BATCH_SIZE = 100
+# A claimed message is offered again if not settled within this time
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+class SMTPConnection:
+    """One SMTP connection reused across messages, reopened when the server drops it"""
+
+    def __init__(self, host, port, username, password, use_ssl=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.last_used = 0
+        self._server = None
+
+    def _connect(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if server.has_extn('starttls'):
+                server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self._server = server
+
+    def send(self, msg):
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Idle connections get closed by the server; retry once on a new one
+            self._server = None
+            self._connect()
+            self._server.send_message(msg)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+class Fast2SMSClient:
+    """Fast2SMS bulk API over a pooled HTTP session"""
+
+    def __init__(self, url, api_key, timeout=(5, 15)):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['authorization'] = api_key
+
+    def send(self, numbers, message):
+        """Send one message to several numbers; raises on any failure"""
+        response = self.session.post(self.url, timeout=self.timeout, data={
+            'message': message,
+            'language': 'english',
+            'route': 'q',
+            'numbers': ','.join(numbers),
+        })
+        response.raise_for_status()
+        result = response.json()
+        if not result.get('return'):
+            raise RuntimeError(f"Fast2SMS rejected the request: {result.get('message')}")
+        return result
+
+
+class NotificationDispatcher:
+    """Queues notifications in the outbox and delivers them from a background thread"""
+
+    def __init__(self, app=None, render_pdf=None):
+        self.app = None
+        self.render_pdf = render_pdf
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self._start_lock = threading.Lock()
+        self.smtp = None
+        self.sms = None
+        if app is not None:
+            self.init_app(app, render_pdf)
+
+    def init_app(self, app, render_pdf=None):
+        self.app = app
+        self.render_pdf = render_pdf or self.render_pdf
+        config = app.config
+        self.sender = config.get('EMAIL_USERNAME')
+        self.smtp = SMTPConnection(
+            config.get('SMTP_SERVER', 'smtp.gmail.com'), int(config.get('SMTP_PORT', 465)),
+            config.get('EMAIL_USERNAME'), config.get('EMAIL_PASSWORD'),
+            use_ssl=config.get('SMTP_USE_SSL', True), timeout=float(config.get('NOTIFY_TIMEOUT', 30))
+        )
+        self.sms = Fast2SMSClient(
+            config.get('FAST2SMS_URL', 'https://www.fast2sms.com/dev/bulkV2'), config.get('FAST2SMS_API_KEY') or '',
+            timeout=(5, float(config.get('NOTIFY_TIMEOUT', 30)))
+        )
+        self.sms_batch_size = int(config.get('SMS_BATCH_SIZE', 100))
+        self.max_attempts = int(config.get('NOTIFY_MAX_ATTEMPTS', 6))
+        self.retry_base = float(config.get('NOTIFY_RETRY_BASE', 30))
+        self.retry_max = float(config.get('NOTIFY_RETRY_MAX', 3600))
+        self.poll_interval = float(config.get('NOTIFY_POLL_INTERVAL', 5))
+        self.smtp_idle_timeout = float(config.get('SMTP_IDLE_TIMEOUT', 60))
+        if config.get('NOTIFY_WORKER', True):
+            # Start with the first request rather than on import, so scripts
+            # and migrations that import the app don't start the thread
+            app.before_first_request(self.start)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+        app.extensions['notifications'] = self
+
+    def enqueue_email(self, recipient, subject, body, invoice_id=None, attachment=None,
+                      attachment_name=None):
+        """Queue an email, attaching the invoice's PDF or the given PDF bytes; sent once the session commits"""
+        attachment_hash = get_pdf_storage().save(attachment) if attachment else None
+        message = OutboxMessage(channel='email', recipient=recipient, subject=subject, body=body,
+                                invoice_id=invoice_id, attachment_hash=attachment_hash,
+                                attachment_name=attachment_name)
+        db.session.add(message)
+        db.session.info['outbox_queued'] = True
+        return message
+
+    def enqueue_sms(self, phone_numbers, text):
+        """Queue an SMS to one or more comma-separated numbers; sent once the session commits"""
+        messages = [
+            OutboxMessage(channel='sms', recipient=number.strip(), body=text)
+            for number in str(phone_numbers).split(',') if number.strip()
+        ]
+        db.session.add_all(messages)
+        db.session.info['outbox_queued'] = True
+        return messages
+
+    def _after_commit(self, session):
+        # The caller's transaction has made the queued messages visible
+        if session.info.pop('outbox_queued', False):
+            self.wake()
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop('outbox_queued', None)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self.run, daemon=True, name='notify-dispatch')
+                self._thread.start()
+
+    def wake(self):
+        if self._thread is not None:
+            self._wake.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.smtp.close()
+
+    def run(self):
+        while not self._stopping:
+            try:
+                delivered = self.dispatch_once()
+            except Exception:
+                logger.exception("Notification dispatch failed")
+                delivered = 0
+            if not delivered:
+                if self.smtp.last_used and time.monotonic() - self.smtp.last_used > self.smtp_idle_timeout:
+                    self.smtp.close()
+                    self.smtp.last_used = 0
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def dispatch_once(self):
+        """Claim and deliver one batch of due messages; returns how many were claimed"""
+        with self.app.app_context():
+            token, messages = self._claim()
+            emails = [message for message in messages if message.channel == 'email']
+            texts = {}
+            for message in messages:
+                if message.channel == 'sms':
+                    texts.setdefault(message.body, []).append(message)
+
+            # Each message or SMS chunk is settled in its own commit, so a
+            # crash or an expired lease only re-sends what wasn't settled yet
+            for message in emails:
+                try:
+                    self.smtp.send(self._build_email(message))
+                    self._sent(token, [message])
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+                    self._failed(token, [message], e, permanent=True)
+                except Exception as e:
+                    self.smtp.close()
+                    self._failed(token, [message], e)
+            for text, batch in texts.items():
+                for start in range(0, len(batch), self.sms_batch_size):
+                    chunk = batch[start:start + self.sms_batch_size]
+                    try:
+                        self.sms.send([message.recipient for message in chunk], text)
+                        self._sent(token, chunk)
+                    except Exception as e:
+                        self._failed(token, chunk, e)
+            return len(messages)
+
+    def _claim(self):
+        now = datetime.utcnow()
+        due = (OutboxMessage.status.in_(('pending', 'sending')), OutboxMessage.next_attempt_at <= now)
+        ids = [message_id for (message_id,) in db.session.query(OutboxMessage.id).filter(*due)
+               .order_by(OutboxMessage.id).limit(DISPATCH_BATCH_SIZE)]
+        if not ids:
+            return None, []
+        # The conditional update makes a row claimable by only one worker
+        token = uuid.uuid4().hex
+        OutboxMessage.query.filter(OutboxMessage.id.in_(ids), *due).update({
+            'status': 'sending', 'claim_token': token, 'next_attempt_at': now + CLAIM_LEASE
+        }, synchronize_session=False)
+        db.session.commit()
+        messages = OutboxMessage.query.filter_by(claim_token=token).order_by(OutboxMessage.id).all()
+        # Detached, the messages keep their loaded values across the per-message commits
+        db.session.expunge_all()
+        return token, messages
+
+    def _build_email(self, message):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = message.recipient
+        msg['Subject'] = message.subject or ''
+        msg.attach(MIMEText(message.body, 'plain'))
+        pdf_data = self._attachment(message)
+        if pdf_data is not None:
+            part = MIMEApplication(pdf_data, _subtype='pdf')
+            part.add_header('Content-Disposition', 'attachment',
+                            filename=message.attachment_name or 'invoice.pdf')
+            msg.attach(part)
+        return msg
+
+    def _attachment(self, message):
+        if message.attachment_hash:
+            return get_pdf_storage().read(message.attachment_hash)
+        if message.invoice_id is None:
+            return None
+        # Returns the stored PDF while it is current and only renders otherwise
+        return self.render_pdf(message.invoice_id)
+
+    @staticmethod
+    def _settle(token, message, values):
+        # Only while this worker still holds the claim; once the lease has
+        # expired the row belongs to whichever worker claimed it next
+        OutboxMessage.query.filter_by(id=message.id, claim_token=token).update(
+            dict(values, claim_token=None, attempts=OutboxMessage.attempts + 1), synchronize_session=False)
+
+    def _sent(self, token, messages):
+        now = datetime.utcnow()
+        for message in messages:
+            self._settle(token, message, {'status': 'sent', 'sent_at': now, 'last_error': None})
+        db.session.commit()
+
+    def _failed(self, token, messages, error, permanent=False):
+        logger.warning("Delivery of %d %s notification(s) failed: %s", len(messages), messages[0].channel, error)
+        now = datetime.utcnow()
+        for message in messages:
+            values = {'last_error': str(error)}
+            if permanent or message.attempts + 1 >= self.max_attempts:
+                values['status'] = 'failed'
+            else:
+                # Exponential backoff with jitter so failed batches don't retry in lockstep
+                delay = min(self.retry_base * 2 ** message.attempts, self.retry_max)
+                values['status'] = 'pending'
+                values['next_attempt_at'] = now + timedelta(seconds=delay * random.uniform(0.5, 1))
+            self._settle(token, message, values)
+        db.session.commit()
+
+
+def init_notifications(app, render_pdf=None):
+    """Set up the outbox dispatcher; render_pdf(invoice_id) returns the PDF to attach to invoice emails"""
+    return NotificationDispatcher(app, render_pdf)
+
+
+if __name__ == '__main__':
+    from app import app, notifier
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--once', action='store_true', help='deliver the due messages and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.once:
+        total = 0
+        while True:
+            delivered = notifier.dispatch_once()
+            if not delivered:
+                break
+            total += delivered
+        notifier.smtp.close()
+        print(f"Processed {total} messages")
+    else:
+        try:
+            notifier.run()
+        except KeyboardInterrupt:
+            notifier.smtp.close()
@@ -0,0 +1,41 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import Invoice
+
+
+def encode_cursor(invoice):
+    """Opaque cursor pointing just after the given invoice in newest-first order"""
+    raw = f"{invoice.date.isoformat()}|{invoice.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (date, id) position encoded in a cursor; ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, invoice_id = raw.split('|')
+        return datetime.fromisoformat(date), int(invoice_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def paginate_invoices(query, user_id, cursor=None, limit=50):
+    """Return (invoices, next_cursor) for one page of a user's invoices, newest first.
+
+    Seeks on (user_id, date, id) instead of using OFFSET, so every page is a
+    range scan of ix_invoice_user_date_id however deep the user pages.
+    next_cursor is None on the last page.
+    """
+    query = query.filter(Invoice.user_id == user_id)
+    if cursor:
+        date, invoice_id = decode_cursor(cursor)
+        # A row-value comparison, unlike the equivalent OR, gives the planner
+        # a range bound on date within the user's part of the index
+        query = query.filter(tuple_(Invoice.date, Invoice.id) < tuple_(date, invoice_id))
+    invoices = query.order_by(Invoice.date.desc(), Invoice.id.desc()).limit(limit + 1).all()
+    if len(invoices) > limit:
+        return invoices[:limit], encode_cursor(invoices[limit - 1])
+    return invoices, None
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import tempfile
+
+from flask import current_app
+
+
+class PDFStorage:
+    """Interface for invoice PDF storage backends.
+
+    PDFs are addressed by the SHA-256 of their content, so identical renders
+    share one stored object and the database only keeps the key.
+    """
+
+    @staticmethod
+    def content_hash(pdf_data):
+        return hashlib.sha256(pdf_data).hexdigest()
+
+    def save(self, pdf_data):
+        """Store the PDF bytes and return their content hash"""
+        raise NotImplementedError
+
+    def read(self, key):
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def path(self, key):
+        """Local file path for the PDF, or None if the backend can't serve files directly"""
+        return None
+
+
+class FilesystemPDFStorage(PDFStorage):
+    """Stores PDFs under root/ab/cd/<hash>.pdf"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.pdf")
+
+    def save(self, pdf_data):
+        key = self.content_hash(pdf_data)
+        path = self.path(key)
+        if os.path.exists(path):
+            return key
+
+        # Write to a temporary file first so readers never see a partial PDF
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pdf_data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+
+    def read(self, key):
+        with open(self.path(key), 'rb') as f:
+            return f.read()
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        if self.exists(key):
+            os.remove(self.path(key))
+
+
+STORAGE_BACKENDS = {
+    'filesystem': lambda app: FilesystemPDFStorage(app.config['PDF_STORAGE_DIR']),
+}
+
+
+def init_pdf_storage(app):
+    """Create the configured PDF storage backend for the app"""
+    backend = app.config.get('PDF_STORAGE_BACKEND', 'filesystem')
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown PDF storage backend: {backend}")
+    storage = STORAGE_BACKENDS[backend](app)
+    app.extensions['pdf_storage'] = storage
+    return storage
+
+
+def get_pdf_storage():
+    return current_app.extensions['pdf_storage']
@@ -0,0 +1,94 @@
+from sqlalchemy import column, inspect, literal_column, table, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, Product
+
+# Trigram FTS5 index over product names, an external-content table on product
+# kept in sync by triggers (so bulk inserts and raw SQL are indexed too)
+SEARCH_TABLE = 'product_search'
+SEARCH_INDEX_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    f"name, content='product', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON product BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON product BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF name ON product "
+    f"WHEN old.name IS NOT new.name BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+]
+
+# Trigrams need at least three characters; shorter terms use ILIKE
+MIN_INDEXED_LENGTH = 3
+
+search_index = table(SEARCH_TABLE, column('rowid'), column('rank'))
+
+
+class ProductSearch:
+    """Ranked, paginated product name search.
+
+    Uses the FTS5 trigram index on SQLite, which answers the same substring
+    queries as ILIKE '%term%' without scanning the product table. Other
+    databases, SQLite builds without FTS5 and terms shorter than a trigram
+    fall back to ILIKE.
+    """
+
+    def __init__(self, per_page=50):
+        self.per_page = per_page
+        self.enabled = False
+
+    def create_index(self):
+        """Create the search index and its triggers if missing (idempotent)"""
+        if db.engine.dialect.name != 'sqlite':
+            return False
+        try:
+            with db.engine.begin() as conn:
+                created = SEARCH_TABLE not in inspect(conn).get_table_names()
+                for statement in SEARCH_INDEX_DDL:
+                    conn.execute(text(statement))
+                if created:
+                    conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+        except OperationalError:
+            # SQLite built without FTS5 or the trigram tokenizer (< 3.34)
+            return False
+        self.enabled = True
+        return True
+
+    def rebuild(self):
+        """Re-index every product, e.g. after loading products with triggers disabled"""
+        if self.enabled:
+            db.session.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+            db.session.commit()
+
+    def uses_index(self, term):
+        return self.enabled and len(term) >= MIN_INDEXED_LENGTH
+
+    def search(self, term, show_hidden=False, page=1, per_page=None):
+        """Return (products, has_next) for one page of matches, best match first"""
+        per_page = per_page or self.per_page
+        query = Product.query
+        if not show_hidden:
+            query = query.filter(Product.hidden.is_(False))
+
+        if term and self.uses_index(term):
+            # Quote the term as one FTS5 string so it matches as a plain substring
+            match = '"' + term.replace('"', '""') + '"'
+            query = query.join(search_index, search_index.c.rowid == Product.id).filter(
+                literal_column(SEARCH_TABLE).op('MATCH')(match)
+            ).order_by(search_index.c.rank, Product.id)
+        else:
+            if term:
+                query = query.filter(Product.name.ilike(f'%{term}%'))
+            query = query.order_by(Product.name, Product.id)
+
+        # Fetch one extra row to know whether there is a next page without a COUNT
+        products = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+        return products[:per_page], len(products) > per_page
+
+
+def init_product_search(app):
+    """Create the product search service for the app"""
+    search = ProductSearch(per_page=app.config.get('PRODUCTS_PER_PAGE', 50))
+    app.extensions['product_search'] = search
+    return search
@@ -0,0 +1,201 @@
+"""Sampled profiling of invoice PDF generation.
+
+With PDF_PROFILING on, a PDF_PROFILE_SAMPLE_RATE fraction of calls to
+InvoiceGenerator.generate_invoice_pdf are profiled, and the profiles are
+aggregated per method and process into PDF_PROFILE_DIR:
+
+- 'cprofile' mode writes <method>-<pid>.pstats (deterministic, every call)
+- 'sampling' mode writes <method>-<pid>.collapsed, stacks sampled every
+  PDF_PROFILE_INTERVAL ms in the format flamegraph.pl and speedscope read
+
+QR code drawing only happens inside generate_invoice_pdf, so its time is
+part of that profile (e.g. pstats' print_callees('_create_qr_code')).
+
+Merge the files of all workers and print or export them with:
+
+    python render_profiler.py instance/profiles --method generate_invoice_pdf
+"""
+import argparse
+import atexit
+import cProfile
+import glob
+import os
+import pstats
+import random
+import sys
+import threading
+from collections import Counter
+from functools import wraps
+
+PROFILED_METHODS = ('generate_invoice_pdf',)
+PROFILE_MODES = ('cprofile', 'sampling')
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack below root_frame until stopped"""
+
+    def __init__(self, thread_id, root_frame, interval):
+        super().__init__(daemon=True, name='pdf-profile-sampler')
+        self.thread_id = thread_id
+        self.root_frame = root_frame
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.root_frame:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frame is self.root_frame and stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class RenderProfiler:
+    """Wraps generator methods and aggregates the profiles of sampled calls"""
+
+    def __init__(self, directory, sample_rate, mode='cprofile', interval_ms=2, flush_every=10):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown PDF_PROFILE_MODE: {mode}")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}
+        self._stacks = {}
+        self._pending = {}
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.flush)
+
+    def wrap(self, name, method):
+        @wraps(method)
+        def profiled(*args, **kwargs):
+            # Calls inside an already profiled call are part of its profile
+            if getattr(self._local, 'active', False) or random.random() >= self.sample_rate:
+                return method(*args, **kwargs)
+            self._local.active = True
+            try:
+                if self.mode == 'cprofile':
+                    return self._run_cprofile(name, method, args, kwargs)
+                return self._run_sampled(name, method, args, kwargs)
+            finally:
+                self._local.active = False
+        return profiled
+
+    def _run_cprofile(self, name, method, args, kwargs):
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(method, *args, **kwargs)
+        finally:
+            with self._lock:
+                if name in self._stats:
+                    self._stats[name].add(profile)
+                else:
+                    self._stats[name] = pstats.Stats(profile)
+                self._sampled(name)
+
+    def _run_sampled(self, name, method, args, kwargs):
+        sampler = _StackSampler(threading.get_ident(), sys._getframe(), self.interval)
+        sampler.start()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stacks = sampler.stop()
+            with self._lock:
+                self._stacks.setdefault(name, Counter()).update(stacks)
+                self._sampled(name)
+
+    def _sampled(self, name):
+        self._pending[name] = self._pending.get(name, 0) + 1
+        if self._pending[name] >= self.flush_every:
+            self._write(name)
+
+    def _write(self, name):
+        path = os.path.join(self.directory, f"{name}-{os.getpid()}")
+        if name in self._stats:
+            _write_atomic(f"{path}.pstats", self._stats[name].dump_stats)
+        if name in self._stacks:
+            def write_collapsed(target):
+                with open(target, 'w') as f:
+                    for stack, count in self._stacks[name].most_common():
+                        f.write(f"{stack} {count}\n")
+            _write_atomic(f"{path}.collapsed", write_collapsed)
+        self._pending[name] = 0
+
+    def flush(self):
+        """Write every profile with unwritten samples"""
+        with self._lock:
+            for name, pending in list(self._pending.items()):
+                if pending:
+                    self._write(name)
+
+
+def init_render_profiler(app, generator):
+    """Profile a sample of the generator's PDF renders if PDF_PROFILING is on"""
+    if not app.config.get('PDF_PROFILING'):
+        return None
+    profiler = RenderProfiler(
+        app.config['PDF_PROFILE_DIR'],
+        float(app.config.get('PDF_PROFILE_SAMPLE_RATE', 0.01)),
+        mode=app.config.get('PDF_PROFILE_MODE', 'cprofile'),
+        interval_ms=float(app.config.get('PDF_PROFILE_INTERVAL', 2)),
+    )
+    for name in PROFILED_METHODS:
+        # Instance attributes shadow the methods
+        setattr(generator, name, profiler.wrap(name, getattr(generator, name)))
+    app.extensions['render_profiler'] = profiler
+    return profiler
+
+
+def merge_collapsed(paths):
+    stacks = Counter()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                stacks[stack] += int(count)
+    return stacks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', help='PDF_PROFILE_DIR to read')
+    parser.add_argument('--method', choices=PROFILED_METHODS, default='generate_invoice_pdf')
+    parser.add_argument('--sort', default='cumulative', help='pstats sort key')
+    parser.add_argument('--limit', type=int, default=30, help='functions to print')
+    parser.add_argument('-o', '--output', help='write the merged collapsed stacks here')
+    args = parser.parse_args()
+
+    pstats_files = sorted(glob.glob(os.path.join(args.directory, f"{args.method}-*.pstats")))
+    collapsed_files = sorted(glob.glob(os.path.join(args.directory, f"{args.method}-*.collapsed")))
+    if not pstats_files and not collapsed_files:
+        sys.exit(f"No {args.method} profiles in {args.directory}")
+    if pstats_files:
+        stats = pstats.Stats(*pstats_files)
+        stats.sort_stats(args.sort).print_stats(args.limit)
+    if collapsed_files:
+        stacks = merge_collapsed(collapsed_files)
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            print(f"Wrote {len(lines)} stacks ({sum(stacks.values())} samples) to {args.output}")
+        else:
+            print('\n'.join(lines[:args.limit]))
@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class RenderQueue:
+    """Local job queue that renders invoice PDFs on a pool of worker threads.
+
+    Checkout only commits the invoice row and submits a job here; the PDF is
+    built in the background and the download endpoint polls its status.
+    Set PDF_RENDER_WORKERS to 0 to render inline (useful for scripts).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        workers = int(app.config.get('PDF_RENDER_WORKERS', 2))
+        if workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf-render')
+        app.extensions['render_queue'] = self
+
+    def submit(self, invoice_id, render):
+        """Queue render(invoice_id) unless a job for the invoice is already running"""
+        with self._lock:
+            job = self._jobs.get(invoice_id)
+            if job is not None and not job.done():
+                return job
+
+            if self._executor is None:
+                # Inline mode runs in the caller's app context and session
+                job = Future()
+                try:
+                    job.set_result(render(invoice_id))
+                except Exception as e:
+                    job.set_exception(e)
+            else:
+                job = self._executor.submit(self._run, invoice_id, render)
+            self._jobs[invoice_id] = job
+
+        job.add_done_callback(lambda finished: self._finish(invoice_id, finished))
+        return job
+
+    def status(self, invoice_id):
+        """Return 'rendering', 'failed' or None when no job is known for the invoice"""
+        with self._lock:
+            job = self._jobs.get(invoice_id)
+        if job is None:
+            return None
+        if not job.done():
+            return 'rendering'
+        return 'failed' if job.exception() is not None else None
+
+    def error(self, invoice_id):
+        with self._lock:
+            job = self._jobs.get(invoice_id)
+        if job is None or not job.done():
+            return None
+        return job.exception()
+
+    def _run(self, invoice_id, render):
+        with self.app.app_context():
+            try:
+                return render(invoice_id)
+            except Exception as e:
+                self.app.logger.error(f"Background PDF rendering failed for invoice {invoice_id}: {str(e)}")
+                raise
+
+    def _finish(self, invoice_id, job):
+        # Keep failed jobs around so the download page can report them
+        if job.exception() is None:
+            with self._lock:
+                if self._jobs.get(invoice_id) is job:
+                    del self._jobs[invoice_id]
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
@@ -0,0 +1,145 @@
+"""Rebuild the sales aggregate tables from invoice history.
+
+Checkout keeps user_sales_total, daily_sales and daily_product_sales up to
+date incrementally; run this after bulk changes to invoices, or to repair
+drift, to recompute them from Invoice and InvoiceItem:
+
+    python sales_aggregates.py
+"""
+import argparse
+import threading
+import time
+
+from sqlalchemy import and_, bindparam, func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from money import ZERO
+from models import db, Invoice, InvoiceItem, Product, UserSalesTotal, DailySales, DailyProductSales
+
+# Seconds the dashboard product count may be stale
+PRODUCT_COUNT_TTL = 60
+
+_product_count = {'value': None, 'expires': 0.0}
+_product_count_lock = threading.Lock()
+
+
+def _increment(model, keys, rows):
+    """Add each row's values to the aggregate row with the same keys.
+
+    Existing rows are found with one SELECT and updated with one executemany
+    UPDATE (col = col + delta, so concurrent checkouts don't lose updates);
+    missing rows are inserted. If a concurrent checkout inserts the same row
+    first, the rows are retried one at a time as update-or-insert.
+    """
+    table = model.__table__
+    key_columns = [table.c[key] for key in keys]
+    value_names = [name for name in rows[0] if name not in keys]
+    update_stmt = table.update().where(
+        and_(*(column == bindparam(f'key_{column.name}') for column in key_columns))
+    ).values({name: table.c[name] + bindparam(f'add_{name}') for name in value_names})
+
+    def update_params(row):
+        params = {f'key_{key}': row[key] for key in keys}
+        params.update({f'add_{name}': row[name] for name in value_names})
+        return params
+
+    existing = {tuple(found) for found in db.session.execute(
+        select(*key_columns).where(tuple_(*key_columns).in_([tuple(row[key] for key in keys) for row in rows]))
+    )}
+    updates = [row for row in rows if tuple(row[key] for key in keys) in existing]
+    inserts = [row for row in rows if tuple(row[key] for key in keys) not in existing]
+    if updates:
+        db.session.execute(update_stmt, [update_params(row) for row in updates])
+    if not inserts:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert(), inserts)
+    except IntegrityError:
+        for row in inserts:
+            if db.session.execute(update_stmt, update_params(row)).rowcount == 0:
+                db.session.execute(table.insert(), row)
+
+
+def record_invoice(invoice, items):
+    """Add a new invoice to the aggregates in the caller's transaction"""
+    day = invoice.date.date()
+    totals = {'invoice_count': 1, 'revenue': invoice.total_amount, 'gst_amount': invoice.gst_amount}
+    _increment(UserSalesTotal, ['user_id'], [dict(totals, user_id=invoice.user_id)])
+    _increment(DailySales, ['user_id', 'day'], [dict(totals, user_id=invoice.user_id, day=day)])
+
+    per_product = {}
+    for item in items:
+        row = per_product.setdefault(item.product_id, {
+            'product_id': item.product_id, 'day': day, 'quantity': 0, 'revenue': ZERO, 'gst_amount': ZERO
+        })
+        row['quantity'] += item.quantity
+        row['revenue'] += item.total
+        row['gst_amount'] += item.gst_amount
+    if per_product:
+        _increment(DailyProductSales, ['product_id', 'day'], list(per_product.values()))
+
+
+def product_count():
+    """Number of products, cached for PRODUCT_COUNT_TTL seconds"""
+    with _product_count_lock:
+        if _product_count['value'] is None or time.monotonic() >= _product_count['expires']:
+            _product_count['value'] = db.session.query(func.count(Product.id)).scalar()
+            _product_count['expires'] = time.monotonic() + PRODUCT_COUNT_TTL
+        return _product_count['value']
+
+
+def dashboard_stats(user_id):
+    """Invoice count, revenue and GST for a user (a primary key lookup) and the product count"""
+    totals = UserSalesTotal.query.get(user_id)
+    return {
+        'invoice_count': totals.invoice_count if totals else 0,
+        'revenue': totals.revenue if totals else ZERO,
+        'gst_amount': totals.gst_amount if totals else ZERO,
+        'product_count': product_count(),
+    }
+
+
+def rebuild_aggregates():
+    """Recompute every aggregate table from Invoice and InvoiceItem in one transaction.
+
+    Money columns hold integer paise, so the SQL SUMs are exact.
+    """
+    day = func.date(Invoice.date)
+    for model in (UserSalesTotal, DailySales, DailyProductSales):
+        model.query.delete()
+
+    db.session.execute(UserSalesTotal.__table__.insert().from_select(
+        ['user_id', 'invoice_count', 'revenue', 'gst_amount'],
+        select(Invoice.user_id, func.count(Invoice.id), func.sum(Invoice.total_amount),
+               func.sum(Invoice.gst_amount)).group_by(Invoice.user_id)
+    ))
+    db.session.execute(DailySales.__table__.insert().from_select(
+        ['user_id', 'day', 'invoice_count', 'revenue', 'gst_amount'],
+        select(Invoice.user_id, day, func.count(Invoice.id), func.sum(Invoice.total_amount),
+               func.sum(Invoice.gst_amount)).group_by(Invoice.user_id, day)
+    ))
+    db.session.execute(DailyProductSales.__table__.insert().from_select(
+        ['product_id', 'day', 'quantity', 'revenue', 'gst_amount'],
+        select(InvoiceItem.product_id, day, func.sum(InvoiceItem.quantity), func.sum(InvoiceItem.total),
+               func.sum(InvoiceItem.gst_amount)).join(Invoice).group_by(InvoiceItem.product_id, day)
+    ))
+    db.session.commit()
+    return {
+        'users': UserSalesTotal.query.count(),
+        'user_days': DailySales.query.count(),
+        'product_days': DailyProductSales.query.count(),
+    }
+
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    with app.app_context():
+        started = time.monotonic()
+        counts = rebuild_aggregates()
+    print(f"Rebuilt aggregates in {time.monotonic() - started:.2f}s: {counts['users']} users, "
+          f"{counts['user_days']} user-days, {counts['product_days']} product-days")
@@ -0,0 +1,53 @@
+from sqlalchemy import case, update
+
+from models import db, Product
+
+
+class StockReservationError(ValueError):
+    """Raised when a cart line can't be reserved; nothing has been reserved"""
+
+    def __init__(self, message, product_ids=(), unavailable=False):
+        super().__init__(message)
+        self.product_ids = list(product_ids)
+        self.unavailable = unavailable
+
+
+def reserve_stock(quantities):
+    """Atomically take {product_id: qty} out of stock in the current transaction.
+
+    All products are loaded with one query and decremented with one UPDATE
+    whose WHERE clause only matches rows that are visible and still have
+    enough stock, so concurrent checkouts can't oversell or lose updates.
+    If any line can't be reserved a StockReservationError is raised and the
+    caller must roll back. Returns {product_id: Product}.
+    """
+    if not quantities:
+        return {}
+    product_ids = list(quantities)
+    products = {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(product_ids))
+    }
+
+    unavailable = [product_id for product_id in product_ids
+                   if product_id not in products or products[product_id].hidden]
+    if unavailable:
+        raise StockReservationError('no longer available', unavailable, unavailable=True)
+    short = [product_id for product_id in product_ids if products[product_id].quantity < quantities[product_id]]
+    if short:
+        raise StockReservationError('insufficient stock', short)
+
+    requested = case(quantities, value=Product.id)
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(product_ids), Product.hidden.is_(False), Product.quantity >= requested)
+        .values(quantity=Product.quantity - requested)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(product_ids):
+        # Another checkout took the stock between the read and the update
+        raise StockReservationError('insufficient stock', product_ids)
+
+    for product in products.values():
+        db.session.expire(product, ['quantity'])
+    return products